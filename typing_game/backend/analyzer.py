@@ -1,52 +1,155 @@
-from sqlalchemy import func, and_
+import heapq
+from sqlalchemy import func, and_, case
 from datetime import datetime, timedelta
 import numpy as np
-from collections import Counter, defaultdict
+from collections import Counter
 from models import Keystroke
 
+# Group names indexed by the finger / hand lookup tables
+FINGERS = ('pinky', 'ring', 'middle', 'index', 'thumb', 'unknown')
+HANDS = ('left', 'right', 'both', 'unknown')
+
+# Finger mapping for QWERTY keyboard
+FINGER_MAP = {
+    'q': ('left', 'pinky'), 'a': ('left', 'ring'), 'z': ('left', 'middle'),
+    'w': ('left', 'ring'), 's': ('left', 'middle'), 'x': ('left', 'index'),
+    'e': ('left', 'middle'), 'd': ('left', 'index'), 'c': ('left', 'index'),
+    'r': ('left', 'index'), 'f': ('left', 'index'), 'v': ('left', 'index'),
+    't': ('left', 'index'), 'g': ('left', 'index'), 'b': ('left', 'index'),
+    'y': ('right', 'index'), 'h': ('right', 'index'), 'n': ('right', 'index'),
+    'u': ('right', 'index'), 'j': ('right', 'index'), 'm': ('right', 'index'),
+    'i': ('right', 'middle'), 'k': ('right', 'middle'), ',': ('right', 'middle'),
+    'o': ('right', 'ring'), 'l': ('right', 'ring'), '.': ('right', 'ring'),
+    'p': ('right', 'pinky'), ';': ('right', 'pinky'), '/': ('right', 'pinky'),
+    ' ': ('both', 'thumb')
+}
+# FINGER_MAP keyed by both cases, for raw (un-lowered) characters
+FINGER_MAP_ANY_CASE = {**{c.upper(): v for c, v in FINGER_MAP.items()}, **FINGER_MAP}
+
+def _build_luts():
+    """FINGER_MAP as byte-indexed tables of FINGERS / HANDS positions"""
+    finger_id = np.full(128, FINGERS.index('unknown'), dtype=np.int8)
+    hand_id = np.full(128, HANDS.index('unknown'), dtype=np.int8)
+    for char, (hand, finger) in FINGER_MAP.items():
+        finger_id[ord(char)] = FINGERS.index(finger)
+        hand_id[ord(char)] = HANDS.index(hand)
+    finger_id.flags.writeable = False
+    hand_id.flags.writeable = False
+    return finger_id, hand_id
+
+_FINGER_ID, _HAND_ID = _build_luts()
+
+def _code_points(keys):
+    """Code point of each lowercased single-character key, 0 for anything
+    else ('' past the end of a text); always one entry per key"""
+    return np.fromiter(
+        (ord(low) if len(low) == 1 else 0 for low in (key.lower() for key in keys)),
+        dtype=np.uint32, count=len(keys)
+    )
+
+def _bigram_kernel(bigrams, times, min_samples=1):
+    """Group transition times by bigram in bulk.
+    
+    Returns (labels, counts, mean times, 90th percentile times) with groups
+    in order of first appearance; percentiles interpolate linearly, as
+    np.percentile does, and are only computed (NaN otherwise) for groups
+    with at least min_samples times.
+    """
+    labels, first, inverse = np.unique(bigrams, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    ids = rank[inverse]
+    
+    counts = np.bincount(ids)
+    means = np.bincount(ids, weights=times) / counts
+    
+    # Qualifying groups' times, sorted together in one pass and laid out
+    # contiguously per group
+    p90s = np.full(len(counts), np.nan)
+    qualifies = counts >= min_samples
+    if qualifies.any():
+        keep = qualifies[ids]
+        kept_ids, kept_times = ids[keep], times[keep]
+        sorted_times = kept_times[np.lexsort((kept_times, kept_ids))]
+        kept_counts = counts[qualifies]
+        starts = np.cumsum(kept_counts) - kept_counts
+        pos = 0.9 * (kept_counts - 1)
+        lo = np.floor(pos).astype(np.intp)
+        hi = np.minimum(lo + 1, kept_counts - 1)
+        low, high = sorted_times[starts + lo], sorted_times[starts + hi]
+        p90s[qualifies] = low + (high - low) * (pos - lo)
+    
+    return labels[order], counts, means, p90s
+
+def _rolling_wpm(times, window_size, step):
+    """WPM over windows of window_size keystrokes starting every step keys.
+    
+    Returns (window start indices, wpm) for the windows that contain at
+    least one timed keystroke; missing (NaN) and zero times are skipped.
+    Sessions under 30 keystrokes give empty arrays.
+    """
+    n = len(times)
+    if n < 30:
+        return np.empty(0, dtype=np.intp), np.empty(0)
+    
+    timed = ~np.isnan(times) & (times != 0)
+    starts = np.arange(0, n - window_size, step)
+    windows = np.lib.stride_tricks.sliding_window_view(np.where(timed, times, 0.0), window_size)[starts]
+    counts = np.lib.stride_tricks.sliding_window_view(timed, window_size)[starts].sum(axis=1)
+    
+    keep = counts > 0
+    avg_time = windows[keep].sum(axis=1) / counts[keep]
+    # WPM = (60 / (avg_time_per_char * 5 chars/word))
+    with np.errstate(divide='ignore'):
+        wpm = np.where(avg_time > 0, 60 / (avg_time * 5), 0.0)
+    return starts[keep], wpm
+
 class TypingAnalyzer:
     def __init__(self, db_manager):
         self.db = db_manager
-        # Finger mapping for QWERTY keyboard
-        self.finger_map = {
-            'q': ('left', 'pinky'), 'a': ('left', 'ring'), 'z': ('left', 'middle'),
-            'w': ('left', 'ring'), 's': ('left', 'middle'), 'x': ('left', 'index'),
-            'e': ('left', 'middle'), 'd': ('left', 'index'), 'c': ('left', 'index'),
-            'r': ('left', 'index'), 'f': ('left', 'index'), 'v': ('left', 'index'),
-            't': ('left', 'index'), 'g': ('left', 'index'), 'b': ('left', 'index'),
-            'y': ('right', 'index'), 'h': ('right', 'index'), 'n': ('right', 'index'),
-            'u': ('right', 'index'), 'j': ('right', 'index'), 'm': ('right', 'index'),
-            'i': ('right', 'middle'), 'k': ('right', 'middle'), ',': ('right', 'middle'),
-            'o': ('right', 'ring'), 'l': ('right', 'ring'), '.': ('right', 'ring'),
-            'p': ('right', 'pinky'), ';': ('right', 'pinky'), '/': ('right', 'pinky'),
-            ' ': ('both', 'thumb')
-        }
     
     def analyze_session(self, session_id, recent_only=True):
         """Comprehensive analysis of user's typing performance"""
+        # Request-scoped session; removed by the app at teardown
         db_session = self.db.get_session()
         
-        # Build query for keystrokes
-        query = db_session.query(Keystroke).filter_by(session_id=session_id)
+        # Build filters for keystrokes
+        filters = [Keystroke.session_id == session_id]
         
         if recent_only:
             cutoff = datetime.utcnow() - timedelta(hours=24)
-            query = query.filter(Keystroke.timestamp >= cutoff)
-        
-        keystrokes = query.all()
-        db_session.close()
+            filters.append(Keystroke.timestamp >= cutoff)
+        
+        # Bare column tuples, streamed in batches and materialized before the
+        # session closes; rows keep attribute access (k.is_correct, ...)
+        keystrokes = list(db_session.query(
+            Keystroke.is_correct,
+            Keystroke.expected_key,
+            Keystroke.time_since_last
+        ).filter(*filters).order_by(Keystroke.timestamp, Keystroke.id).yield_per(2000))
+        if keystrokes:
+            # Per-key and per-bigram grouping runs in SQL
+            key_rows = self._query_key_aggregates(db_session, filters)
+            bigram_rows = self._query_bigram_transitions(db_session, filters)
+            # Temporal chunks of max(10, n // 5) keystrokes, also grouped in SQL
+            chunk_rows = (self._query_chunk_aggregates(db_session, filters, max(10, len(keystrokes) // 5))
+                          if len(keystrokes) >= 10 else [])
         
         if not keystrokes:
             return self.get_default_analysis()
         
+        # Column arrays shared by the vectorized metrics
+        soa = self._to_soa(keystrokes)
+        
         # Calculate metrics
         analysis = {
-            'overall': self._calculate_overall_metrics(keystrokes),
-            'key_level': self._analyze_key_performance(keystrokes),
-            'bigram_level': self._analyze_bigram_performance(keystrokes),
-            'finger_level': self._analyze_finger_performance(keystrokes),
-            'hand_level': self._analyze_hand_performance(keystrokes),
-            'temporal_patterns': self._analyze_temporal_patterns(keystrokes)
+            'overall': self._calculate_overall_metrics(soa),
+            'key_level': self._analyze_key_performance(key_rows),
+            'bigram_level': self._analyze_bigram_performance(bigram_rows),
+            'finger_level': self._analyze_finger_performance(key_rows),
+            'hand_level': self._analyze_hand_performance(key_rows),
+            'temporal_patterns': self._analyze_temporal_patterns(chunk_rows)
         }
         
         # Generate actionable insights
@@ -56,32 +159,112 @@ class TypingAnalyzer:
         
         # --- MACHINE LEARNING SECTION ---
         # 1. Predictive Modeling (Regression)
-        analysis['ml_prediction'] = self._predict_future_performance(keystrokes)
+        analysis['ml_prediction'] = self._predict_future_performance(soa)
         
         return analysis
     
-    def _calculate_overall_metrics(self, keystrokes):
+    def _query_key_aggregates(self, db_session, filters):
+        """Per-key totals grouped in SQL, in order of each key's first keystroke:
+        (key, total, correct, timed, time_sum, time_sq_sum) with keys
+        lowercased; timed counts only non-zero time_since_last values"""
+        t = func.nullif(Keystroke.time_since_last, 0)
+        rows = db_session.query(
+            Keystroke.expected_key,
+            func.count(),
+            func.sum(case((Keystroke.is_correct, 1), else_=0)),
+            func.count(t),
+            func.sum(t),
+            func.sum(t * t)
+        ).filter(*filters).group_by(Keystroke.expected_key).order_by(
+            func.min(Keystroke.timestamp), func.min(Keystroke.id)
+        ).all()
+        
+        # SQLite's lower() only folds ASCII, so case variants are merged
+        # here with str.lower(); the first variant seen keeps the order
+        merged = {}
+        for key, *sums in rows:
+            key = key.lower()
+            if key in merged:
+                merged[key] = [a + (b or 0) for a, b in zip(merged[key], sums)]
+            else:
+                merged[key] = [b or 0 for b in sums]
+        return [(key, *sums) for key, sums in merged.items()]
+    
+    def _query_chunk_aggregates(self, db_session, filters, chunk_size):
+        """(chunk_index, size, correct, avg time) per consecutive chunk_size
+        keystrokes, numbered with ROW_NUMBER(); the average skips each
+        chunk's first keystroke and missing or zero times"""
+        row_number = func.row_number().over(order_by=(Keystroke.timestamp, Keystroke.id))
+        numbered = db_session.query(
+            ((row_number - 1) // chunk_size).label('chunk'),
+            ((row_number - 1) % chunk_size).label('offset'),
+            Keystroke.is_correct.label('is_correct'),
+            Keystroke.time_since_last.label('t')
+        ).filter(*filters).subquery()
+        return db_session.query(
+            numbered.c.chunk,
+            func.count(),
+            func.sum(case((numbered.c.is_correct, 1), else_=0)),
+            func.avg(case((numbered.c.offset != 0, func.nullif(numbered.c.t, 0))))
+        ).group_by(numbered.c.chunk).order_by(numbered.c.chunk).all()
+    
+    def _query_bigram_transitions(self, db_session, filters):
+        """(bigram, time_since_last) for each timed transition between two
+        correct keystrokes, paired with LAG() over the filtered keystrokes"""
+        window = {'order_by': (Keystroke.timestamp, Keystroke.id)}
+        pairs = db_session.query(
+            func.lag(Keystroke.expected_key).over(**window).label('prev_key'),
+            func.lag(Keystroke.is_correct).over(**window).label('prev_correct'),
+            Keystroke.expected_key.label('key'),
+            Keystroke.is_correct.label('is_correct'),
+            Keystroke.time_since_last.label('t'),
+            Keystroke.timestamp.label('ts'),
+            Keystroke.id.label('id')
+        ).filter(*filters).subquery()
+        rows = db_session.query(
+            pairs.c.prev_key, pairs.c.key, pairs.c.t
+        ).filter(
+            pairs.c.prev_correct == 1, pairs.c.is_correct == 1, pairs.c.t != 0
+        ).order_by(pairs.c.ts, pairs.c.id).all()
+        # Lowercased with str.lower() (SQLite's lower() only folds ASCII)
+        return [(f"{prev.lower()}{key.lower()}", t) for prev, key, t in rows]
+    
+    def _to_soa(self, keystrokes):
+        """Extract keystroke columns once into parallel NumPy arrays
+        (time_since_last is NaN where missing, expected_key as lowercased
+        code points with 0 for '')"""
+        n = len(keystrokes)
+        return {
+            'expected': _code_points([k.expected_key for k in keystrokes]),
+            'is_correct': np.fromiter((bool(k.is_correct) for k in keystrokes), dtype=bool, count=n),
+            'time_since_last': np.fromiter(
+                (np.nan if k.time_since_last is None else k.time_since_last for k in keystrokes),
+                dtype=np.float64, count=n
+            ),
+        }
+    
+    def _calculate_overall_metrics(self, soa):
         """Calculate overall typing metrics"""
-        total = len(keystrokes)
-        correct = sum(1 for k in keystrokes if k.is_correct)
+        is_correct = soa['is_correct']
+        total = len(is_correct)
+        correct = int(is_correct.sum())
         errors = total - correct
         accuracy = correct / total if total > 0 else 0
         
         # Calculate speed (excluding first keystroke)
-        times = [k.time_since_last for k in keystrokes[1:] if k.time_since_last]
-        avg_speed = np.mean(times) if times else 0
+        times = soa['time_since_last'][1:]
+        times = times[~np.isnan(times) & (times != 0)]
+        avg_speed = float(times.mean()) if times.size else 0
         wpm = (60 / (avg_speed * 5)) if avg_speed > 0 else 0  # 5 chars per word avg
         
-        # Error consistency
-        error_sequences = []
-        current_seq = 0
-        for k in keystrokes:
-            if not k.is_correct:
-                current_seq += 1
-            else:
-                if current_seq > 0:
-                    error_sequences.append(current_seq)
-                    current_seq = 0
+        # Error consistency: running miss-streak length at every keystroke
+        # (each correct keystroke resets the run start), read just before a
+        # correct keystroke ends the run; a run still open at the end is not
+        # counted
+        positions = np.arange(1, total + 1)
+        run_start = np.maximum.accumulate(np.where(is_correct, positions, 0))
+        streak = positions - run_start
+        error_sequences = streak[:-1][is_correct[1:]]
         
         return {
             'total_keystrokes': total,
@@ -89,99 +272,86 @@ class TypingAnalyzer:
             'error_rate': errors / total if total > 0 else 0,
             'avg_speed_ms': avg_speed * 1000 if avg_speed else 0,
             'wpm': wpm,
-            'max_error_streak': max(error_sequences) if error_sequences else 0,
-            'common_error_patterns': self._find_error_patterns(keystrokes)
+            'max_error_streak': int(error_sequences.max()) if error_sequences.size else 0,
+            'common_error_patterns': self._find_error_patterns(soa)
         }
     
-    def _analyze_key_performance(self, keystrokes):
+    def _analyze_key_performance(self, key_rows):
         """Analyze performance for individual keys"""
-        key_stats = defaultdict(lambda: {'total': 0, 'correct': 0, 'times': []})
-        
-        for k in keystrokes:
-            if k.key_pressed.lower() == k.expected_key.lower():
-                key = k.expected_key.lower()
-            else:
-                key = k.expected_key.lower()  # Track expected key even if wrong
-            
-            stats = key_stats[key]
-            stats['total'] += 1
-            if k.is_correct:
-                stats['correct'] += 1
-            if k.time_since_last:
-                stats['times'].append(k.time_since_last)
-        
-        # Calculate metrics per key
+        # Expected key is tracked even if the wrong key was pressed
         results = {}
-        for key, stats in key_stats.items():
-            if stats['total'] >= 3:  # Only analyze keys with enough samples
-                accuracy = stats['correct'] / stats['total']
-                avg_time = np.mean(stats['times']) * 1000 if stats['times'] else 0
-                std_time = np.std(stats['times']) * 1000 if len(stats['times']) > 1 else 0
+        for key, total, correct, timed, time_sum, time_sq_sum in key_rows:
+            if total >= 3:  # Only analyze keys with enough samples
+                accuracy = correct / total
+                mean = time_sum / timed if timed else 0
+                avg_time = mean * 1000
+                # Population std from the running sums, as np.std
+                std_time = np.sqrt(max(time_sq_sum / timed - mean * mean, 0)) * 1000 if timed > 1 else 0
                 
                 results[key] = {
                     'accuracy': accuracy,
                     'error_rate': 1 - accuracy,
                     'avg_time_ms': avg_time,
                     'time_consistency': std_time,
-                    'sample_size': stats['total']
+                    'sample_size': total
                 }
         
-        return dict(sorted(results.items(), 
-                          key=lambda x: x[1]['error_rate'], 
-                          reverse=True)[:10])  # Top 10 problematic keys
+        return dict(heapq.nlargest(10, results.items(), 
+                                   key=lambda x: x[1]['error_rate']))  # Top 10 problematic keys
     
-    def _analyze_bigram_performance(self, keystrokes):
+    def _analyze_bigram_performance(self, bigram_rows):
         """Analyze performance for character pairs"""
-        bigram_stats = defaultdict(lambda: {'total': 0, 'times': []})
+        if not bigram_rows:
+            return {}
         
-        # Group keystrokes by context
-        for i in range(1, len(keystrokes)):
-            prev = keystrokes[i-1]
-            curr = keystrokes[i]
-            
-            if prev.is_correct and curr.is_correct:
-                bigram = f"{prev.expected_key.lower()}{curr.expected_key.lower()}"
-                if curr.time_since_last:
-                    bigram_stats[bigram]['total'] += 1
-                    bigram_stats[bigram]['times'].append(curr.time_since_last)
+        # Transitions already paired and filtered in SQL; group them in bulk
+        bigrams = np.array([bigram for bigram, _ in bigram_rows])
+        times = np.fromiter((t for _, t in bigram_rows), dtype=np.float64, count=len(bigram_rows))
+        labels, counts, means, p90s = _bigram_kernel(bigrams, times, min_samples=5)
         
         # Calculate metrics per bigram
         results = {}
-        for bigram, stats in bigram_stats.items():
-            if stats['total'] >= 5:  # Only analyze bigrams with enough samples
-                avg_time = np.mean(stats['times']) * 1000
-                percentile_90 = np.percentile(stats['times'], 90) * 1000
-                
-                results[bigram] = {
-                    'avg_transition_time_ms': avg_time,
-                    'slow_transition_threshold': percentile_90,
-                    'sample_size': stats['total']
-                }
+        for g in np.flatnonzero(counts >= 5):  # Only analyze bigrams with enough samples
+            results[str(labels[g])] = {
+                'avg_transition_time_ms': float(means[g]) * 1000,
+                'slow_transition_threshold': float(p90s[g]) * 1000,
+                'sample_size': int(counts[g])
+            }
         
-        return dict(sorted(results.items(), 
-                          key=lambda x: x[1]['avg_transition_time_ms'], 
-                          reverse=True)[:15])  # Top 15 slow bigrams
+        return dict(heapq.nlargest(15, results.items(), 
+                                   key=lambda x: x[1]['avg_transition_time_ms']))  # Top 15 slow bigrams
+    
+    def _accumulate_key_groups(self, key_rows, lut, names):
+        """Fold per-key SQL totals into groups (finger, hand, ...) through a
+        byte-indexed lookup table, in order of each group's first key"""
+        # '' and non-ASCII keys land on entry 0, which maps to unknown
+        codes = _code_points([key for key, *_ in key_rows]).astype(np.intp)
+        codes[codes >= len(lut)] = 0
+        sums = np.array([(total, correct, timed, time_sum or 0.0)
+                         for _, total, correct, timed, time_sum, _ in key_rows], dtype=np.float64)
+        ids = lut[codes]
+        totals = [np.bincount(ids, weights=sums[:, col], minlength=len(names)) for col in range(4)]
+        
+        uniq, first = np.unique(ids, return_index=True)
+        groups = {}
+        for g in uniq[np.argsort(first)]:
+            groups[names[g]] = {
+                'total': int(totals[0][g]),
+                'correct': int(totals[1][g]),
+                'timed': int(totals[2][g]),
+                'time_sum': float(totals[3][g])
+            }
+        return groups
     
-    def _analyze_finger_performance(self, keystrokes):
+    def _analyze_finger_performance(self, key_rows):
         """Analyze performance by finger"""
-        finger_stats = defaultdict(lambda: {'total': 0, 'correct': 0, 'times': []})
-        
-        for k in keystrokes:
-            finger_info = self.finger_map.get(k.expected_key.lower(), ('unknown', 'unknown'))
-            finger = finger_info[1]
-            
-            stats = finger_stats[finger]
-            stats['total'] += 1
-            if k.is_correct:
-                stats['correct'] += 1
-            if k.time_since_last:
-                stats['times'].append(k.time_since_last)
+        finger_stats = self._accumulate_key_groups(key_rows, _FINGER_ID, FINGERS)
         
         results = {}
         for finger, stats in finger_stats.items():
             if stats['total'] >= 5:
                 accuracy = stats['correct'] / stats['total']
-                avg_time = np.mean(stats['times']) * 1000 if stats['times'] else 0
+                avg_time = stats['time_sum'] / stats['timed'] * 1000 if stats['timed'] else 0
                 
                 results[finger] = {
                     'accuracy': accuracy,
@@ -191,28 +361,16 @@ class TypingAnalyzer:
         
         return results
     
-    def _analyze_hand_performance(self, keystrokes):
+    def _analyze_hand_performance(self, key_rows):
         """Analyze performance by hand"""
-        hand_stats = {'left': {'total': 0, 'correct': 0, 'times': []},
-                     'right': {'total': 0, 'correct': 0, 'times': []},
-                     'both': {'total': 0, 'correct': 0, 'times': []}}
+        hand_stats = self._accumulate_key_groups(key_rows, _HAND_ID, HANDS)
         
-        for k in keystrokes:
-            hand = self.finger_map.get(k.expected_key.lower(), ('unknown', 'unknown'))[0]
-            
-            stats = hand_stats.get(hand)
-            if stats:
-                stats['total'] += 1
-                if k.is_correct:
-                    stats['correct'] += 1
-                if k.time_since_last:
-                    stats['times'].append(k.time_since_last)
-
         results = {}
-        for hand, stats in hand_stats.items():
-            if stats['total'] > 0:
+        for hand in ('left', 'right', 'both'):
+            stats = hand_stats.get(hand)
+            if stats and stats['total'] > 0:
                 accuracy = stats['correct'] / stats['total']
-                avg_time = np.mean(stats['times']) * 1000 if stats['times'] else 0
+                avg_time = stats['time_sum'] / stats['timed'] * 1000 if stats['timed'] else 0
                 
                 results[hand] = {
                     'accuracy': accuracy,
@@ -222,23 +380,20 @@ class TypingAnalyzer:
         
         return results
     
-    def _analyze_temporal_patterns(self, keystrokes):
+    def _analyze_temporal_patterns(self, chunk_rows):
         """Analyze how performance changes over time"""
-        if len(keystrokes) < 10:
+        if not chunk_rows:
             return {}
         
-        # Split into chunks
-        chunk_size = max(10, len(keystrokes) // 5)
+        # Chunks already aggregated in SQL
         chunks = []
         
-        for i in range(0, len(keystrokes), chunk_size):
-            chunk = keystrokes[i:i+chunk_size]
-            if len(chunk) >= 5:
-                accuracy = sum(1 for k in chunk if k.is_correct) / len(chunk)
-                times = [k.time_since_last for k in chunk[1:] if k.time_since_last]
-                avg_speed = np.mean(times) * 1000 if times else 0
+        for chunk_index, size, correct, avg_time in chunk_rows:
+            if size >= 5:
+                accuracy = correct / size
+                avg_speed = avg_time * 1000 if avg_time else 0
                 chunks.append({
-                    'chunk_index': i // chunk_size,
+                    'chunk_index': chunk_index,
                     'accuracy': accuracy,
                     'avg_speed_ms': avg_speed,
                     'error_rate': 1 - accuracy
@@ -258,63 +413,33 @@ class TypingAnalyzer:
             'fatigue_indicator': self._detect_fatigue(chunks)
         }
 
-    def _predict_future_performance(self, keystrokes):
+    def _predict_future_performance(self, soa):
         """
         Uses Linear Regression (ML) to predict future WPM based on current session trend.
         """
-        if len(keystrokes) < 30:
-            return None
-            
-        # Create time series of speeds (WPM)
-        window_size = 10
-        speeds = []
-        indices = []
-        
-        # Calculate rolling WPM
-        for i in range(0, len(keystrokes) - window_size, 5):
-            chunk = keystrokes[i:i+window_size]
-            times = [k.time_since_last for k in chunk if k.time_since_last]
-            if times:
-                avg_time = np.mean(times)
-                # WPM = (60 / (avg_time_per_char * 5 chars/word))
-                wpm = (60 / (avg_time * 5)) if avg_time > 0 else 0
-                speeds.append(wpm)
-                indices.append(i)
-                
+        indices, speeds = _rolling_wpm(soa['time_since_last'], window_size=10, step=5)
         if len(speeds) < 3:
             return None
             
-        try:
-            # Simple Linear Regression (Polyfit degree 1)
-            # y = mx + c
-            slope, intercept = np.polyfit(indices, speeds, 1)
-            
-            # Predict WPM for the next 50 keystrokes
-            next_index = indices[-1] + 50
-            predicted_wpm = (slope * next_index) + intercept
-            
-            return {
-                'current_wpm_trend': round(slope * 100, 2), # Change per 100 keystrokes
-                'predicted_next_wpm': round(predicted_wpm, 1),
-                'confidence': 'High' if len(speeds) > 10 else 'Low'
-            }
-        except Exception:
+        # Simple Linear Regression, closed-form least squares
+        # y = mx + c
+        x = indices.astype(np.float64)
+        y = speeds
+        x_dev = x - x.mean()
+        denominator = (x_dev * x_dev).sum()
+        if denominator == 0:
             return None
-
-    def _extract_biometric_features(self, keystrokes):
-        """
-        Extracts a 'Keystroke Dynamics' vector for User Verification (Classification).
-        This vector would be the input (X) for a Random Forest or Neural Network.
-        """
-        # 1. Flight Time Latency (H-H)
-        flight_times = [k.time_since_last for k in keystrokes if k.time_since_last]
+        slope = float((x_dev * (y - y.mean())).sum() / denominator)
+        intercept = float(y.mean()) - slope * float(x.mean())
+        
+        # Predict WPM for the next 50 keystrokes
+        next_index = int(indices[-1]) + 50
+        predicted_wpm = (slope * next_index) + intercept
         
-        # 2. Key-Specific Latencies (e.g., how fast they type 'th')
-        # This creates a unique 'fingerprint' of the user
         return {
-            'mean_flight': np.mean(flight_times) if flight_times else 0,
-            'std_flight': np.std(flight_times) if flight_times else 0,
-            'median_flight': np.median(flight_times) if flight_times else 0
+            'current_wpm_trend': round(slope * 100, 2), # Change per 100 keystrokes
+            'predicted_next_wpm': round(predicted_wpm, 1),
+            'confidence': 'High' if len(speeds) > 10 else 'Low'
         }
     
     def _detect_fatigue(self, chunks):
@@ -339,20 +464,23 @@ class TypingAnalyzer:
         else:
             return 'no_fatigue'
     
-    def _find_error_patterns(self, keystrokes):
+    def _find_error_patterns(self, soa):
         """Identify common error patterns"""
-        error_contexts = []
-        
-        for i in range(1, len(keystrokes)):
-            if not keystrokes[i].is_correct:
-                # Look at previous 2 characters
-                context = ""
-                if i >= 2:
-                    context += keystrokes[i-2].expected_key.lower()
-                if i >= 1:
-                    context += keystrokes[i-1].expected_key.lower()
-                context += keystrokes[i].expected_key.lower()
-                error_contexts.append(context)
+        keys = soa['expected']
+        wrong = np.flatnonzero(~soa['is_correct'])
+        wrong = wrong[wrong >= 1]
+        
+        # Look at previous 2 characters: one row of code points per miss; the
+        # miss at index 1 only has one predecessor, so its row ends in NUL
+        contexts = np.zeros((len(wrong), 3), dtype=np.uint32)
+        full = wrong >= 2
+        contexts[full] = np.stack((keys[wrong[full] - 2], keys[wrong[full] - 1], keys[wrong[full]]), axis=1)
+        contexts[~full, 0] = keys[wrong[~full] - 1]
+        contexts[~full, 1] = keys[wrong[~full]]
+        
+        # Each row read as one string; trailing NULs drop off, and inner
+        # ones ('' keys) are removed as concatenating '' would
+        error_contexts = [c.replace('\0', '') for c in contexts.view('<U3').ravel().tolist()]
         
         # Count occurrences
         counter = Counter(error_contexts)
@@ -375,13 +503,16 @@ class TypingAnalyzer:
             if stats['avg_transition_time_ms'] > 400:
                 insights.append(f"Transition '{bigram}' is slow ({stats['avg_transition_time_ms']:.0f}ms)")
         
-        # Finger insights
-        worst_finger = min(analysis['finger_level'].items(), 
-                          key=lambda x: x[1]['accuracy'])
-        best_finger = max(analysis['finger_level'].items(), 
-                         key=lambda x: x[1]['accuracy'])
+        # Finger insights: worst and best finger in one pass (none if no
+        # finger had enough samples)
+        worst_finger = best_finger = None
+        for finger, stats in analysis['finger_level'].items():
+            if worst_finger is None or stats['accuracy'] < worst_finger[1]['accuracy']:
+                worst_finger = (finger, stats)
+            if best_finger is None or stats['accuracy'] > best_finger[1]['accuracy']:
+                best_finger = (finger, stats)
         
-        if worst_finger[1]['accuracy'] < 0.85:
+        if worst_finger and worst_finger[1]['accuracy'] < 0.85:
             insights.append(f"{worst_finger[0].title()} finger has low accuracy ({worst_finger[1]['accuracy']:.1%})")
         
         # Hand imbalance
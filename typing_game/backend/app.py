@@ -3,13 +3,13 @@ from flask_cors import CORS
 import sys
 import os
 import webbrowser
+import orjson
 from threading import Timer
 from database import DatabaseManager
 from analyzer import TypingAnalyzer
 from text_generator import AdaptiveTextGenerator
 from game_engine import GameEngine
 
-app = Flask(__name__, static_folder='../frontend')
 # Determine the correct path for frontend files (works for source and EXE)
 if getattr(sys, 'frozen', False):
     FRONTEND_FOLDER = os.path.join(sys._MEIPASS, 'frontend')
@@ -20,12 +20,29 @@ app = Flask(__name__, static_folder=FRONTEND_FOLDER)
 app.secret_key = os.environ.get('SECRET_KEY', 'dev_secret_key_change_in_prod')
 CORS(app, supports_credentials=True)
 
+def ojsonify(obj):
+    """jsonify for the larger payloads, encoded with orjson (NumPy scalars included)"""
+    return app.response_class(orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY), mimetype='application/json')
+
+def json_body():
+    """Request body parsed with orjson; None unless it is a JSON object"""
+    try:
+        data = orjson.loads(request.get_data(cache=False))
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
 # Initialize components  
 db_manager = DatabaseManager()
 analyzer = TypingAnalyzer(db_manager)
 text_generator = AdaptiveTextGenerator()
 game_engine = GameEngine(db_manager, analyzer, text_generator)
 
+@app.teardown_appcontext
+def remove_db_session(exception=None):
+    # Release the request's scoped DB session
+    db_manager.remove_session()
+
 @app.route('/api/start_session', methods=['POST'])
 def start_session():
     user_id = session.get('user_id')
@@ -37,7 +54,7 @@ def start_session():
 
 @app.route('/api/register', methods=['POST'])
 def register():
-    data = request.get_json()
+    data = json_body()
     if not data or 'username' not in data or 'password' not in data:
         return jsonify({'error': 'Missing credentials'}), 400
         
@@ -50,7 +67,7 @@ def register():
 
 @app.route('/api/login', methods=['POST'])
 def login():
-    data = request.get_json()
+    data = json_body()
     if not data or 'username' not in data or 'password' not in data:
         return jsonify({'error': 'Missing credentials'}), 400
         
@@ -69,19 +86,23 @@ def login():
 
 @app.route('/api/set_mode', methods=['POST'])
 def set_mode():
-    data = request.get_json()
+    data = json_body()
+    if data is None:
+        return jsonify({'error': 'Invalid JSON data'}), 400
     learn_mode = bool(data.get('learn_mode', True))
     active_session_id = session.get('active_session_id')
 
     # FIX: Only apply mode to the current user's active session
 
     # Auto-recover session if missing (e.g. server restart)
-    if active_session_id and active_session_id not in game_engine.active_sessions:
+    state = game_engine.active_sessions.get(active_session_id) if active_session_id else None
+    if active_session_id and state is None:
         user_id = session.get('user_id')
         game_engine.start_session(active_session_id, user_id)
+        state = game_engine.active_sessions.get(active_session_id)
 
-    if active_session_id and active_session_id in game_engine.active_sessions:
-        game_engine.active_sessions[active_session_id]['learn_mode'] = learn_mode
+    if state is not None:
+        state.learn_mode = learn_mode
     else:
         return jsonify({'error': 'No active session found'}), 404
 
@@ -89,16 +110,17 @@ def set_mode():
 
 @app.route('/api/save_progress', methods=['POST'])
 def save_progress():
-    user_id = session.get('user_id'),
+    user_id = session.get('user_id')
     if not user_id:
         return jsonify({'error': 'Login required'}), 401
 
-    game_engine.force_save_user(user_id)
+    if not game_engine.force_save_user(user_id):
+        return jsonify({'error': 'Progress could not be saved'}), 500
     return jsonify({'message': 'Progress saved successfully'})
 
 @app.route('/api/keystroke', methods=['POST'])
 def process_keystroke():
-    data = request.get_json(force=True, silent=True)
+    data = json_body()
     if not data:
         return jsonify({'error': 'Invalid JSON data'}), 400
         
@@ -134,7 +156,7 @@ def get_stats(session_id):
     if not active_id or str(active_id) != str(session_id):
         return jsonify({'error': 'Unauthorized'}), 403
     stats = game_engine._get_session_stats(session_id)
-    return jsonify(stats)
+    return ojsonify(stats)
 
 @app.route('/api/analysis/<string:session_id>')
 def get_analysis(session_id):
@@ -142,7 +164,7 @@ def get_analysis(session_id):
     if not active_id or str(active_id) != str(session_id):
         return jsonify({'error': 'Unauthorized'}), 403
     analysis = game_engine.get_analysis(session_id)
-    return jsonify(analysis)
+    return ojsonify(analysis)
 
 @app.route('/api/new_text/<string:session_id>')
 def get_new_text(session_id):
@@ -152,15 +174,16 @@ def get_new_text(session_id):
         return jsonify({'error': 'Unauthorized'}), 403
 
     # Auto-recover session if missing from memory but valid in cookie
-    if session_id not in game_engine.active_sessions:
+    state = game_engine.active_sessions.get(session_id)
+    if state is None:
         user_id = session.get('user_id')
         game_engine.start_session(session_id, user_id)
+        state = game_engine.active_sessions.get(session_id)
 
-    if session_id in game_engine.active_sessions:
+    if state is not None:
         app.logger.info(f"Frontend requested new text for session {session_id}")
         game_engine.generate_new_text(session_id)
-        state = game_engine.active_sessions[session_id]
-        return jsonify({'text': state['current_text']})
+        return jsonify({'text': state.current_text})
     return jsonify({'error': 'Session not found'}), 404
 
 @app.route('/api/history/<string:session_id>')
@@ -168,6 +191,7 @@ def get_history(session_id):
     active_id = session.get('active_session_id')
     if not active_id or str(active_id) != str(session_id):
         return jsonify({'error': 'Unauthorized'}), 403
+    game_engine.flush()
     keystrokes = db_manager.get_keystroke_history(session_id, limit=100)
     history = [{
         'key': k.key_pressed,
@@ -176,21 +200,18 @@ def get_history(session_id):
         'time': k.time_since_last,
         'timestamp': k.timestamp.isoformat()
     } for k in keystrokes]
-    return jsonify(history)
+    return ojsonify(history)
 
 @app.route('/')
 def serve_index():
-    return send_from_directory('../frontend', 'index.html')
     return send_from_directory(FRONTEND_FOLDER, 'index.html')
 
 @app.route('/login')
 def serve_login():
-    return send_from_directory('../frontend', 'login.html')
     return send_from_directory(FRONTEND_FOLDER, 'login.html')
 
 @app.route('/<path:path>')
 def serve_static(path):
-    return send_from_directory('../frontend', path)
     return send_from_directory(FRONTEND_FOLDER, path)
 
 if __name__ == '__main__':
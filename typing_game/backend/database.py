@@ -1,20 +1,50 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import bindparam, create_engine, event, func, select, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.exc import DatabaseError
 from models import Base, UserSession, Keystroke, PerformanceMetrics, GameState, User, UserProgress, UserAnalysis
 import os
+import time
+import orjson
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 
+CACHE_TTL_SECONDS = 30
+
+# Applied to every new SQLite connection. WAL with synchronous=NORMAL only
+# fsyncs at checkpoints instead of on every keystroke batch commit; readers
+# and the background writer wait on each other instead of failing with
+# "database is locked".
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-65536",  # KiB
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Column lists for progress / analysis reads; these return plain Row tuples
+# (attribute access, no session or identity map) that threads can share
+_PROGRESS_COLUMNS = tuple(UserProgress.__table__.c)
+_ANALYSIS_COLUMNS = tuple(UserAnalysis.__table__.c)
+
 class DatabaseManager:
+    # session_id is unique but not the primary key, so Session.get() can't
+    # serve it; one shared statement keeps its compiled SQL cache entry hot
+    _session_by_id = select(UserSession).where(
+        UserSession.session_id == bindparam('session_id')
+    )
+
     def __init__(self, db_path='data/user_data.db'):
         self.db_path = db_path
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
-        self.engine = create_engine(f'sqlite:///{self.db_path}')
+        self.engine = self._create_engine()
         
         try:
             # Attempt to connect and create tables
             Base.metadata.create_all(self.engine)
+            self._upgrade_indexes()
         except DatabaseError as e:
             print(f"--- DATABASE ERROR: {e} ---")
             print(f"The database file at '{self.db_path}' appears to be corrupt.")
@@ -23,19 +53,77 @@ class DatabaseManager:
             # Dispose of the old engine's connection pool before deleting the file
             self.engine.dispose()
             
-            if os.path.exists(self.db_path):
-                os.remove(self.db_path)
+            # WAL mode keeps -wal / -shm files next to the database
+            for path in (self.db_path, self.db_path + '-wal', self.db_path + '-shm'):
+                if os.path.exists(path):
+                    os.remove(path)
             
             # Re-initialize and try again
-            self.engine = create_engine(f'sqlite:///{self.db_path}')
+            self.engine = self._create_engine()
             Base.metadata.create_all(self.engine)
             print("--- RECOVERY SUCCESSFUL: New database created. ---")
             
-        self.Session = sessionmaker(bind=self.engine)
+        # One session per thread; helpers (bulk_insert included) never close
+        # it. Request threads' sessions are removed by the app's teardown
+        # hook, and the background writer calls remove_session() after each
+        # batch. Attributes stay loaded after commit so returned rows remain
+        # readable once the session is gone.
+        self.Session = scoped_session(sessionmaker(bind=self.engine, expire_on_commit=False))
+
+        # user_id -> (loaded_at, Row). Every write here (the background
+        # writer's included) replaces its entry with the row it returned;
+        # writes from other processes show up once the entry expires.
+        self._progress_cache = {}
+        self._analysis_cache = {}
+
+        # Logins for unknown names are still checked against this, so they
+        # take as long as a real wrong password
+        self._dummy_hash = generate_password_hash('')
+    
+    def _create_engine(self):
+        # JSON columns (weak_keys, unlocked_levels, ...) go through orjson
+        engine = create_engine(
+            f'sqlite:///{self.db_path}',
+            json_serializer=lambda value: orjson.dumps(value).decode(),
+            json_deserializer=orjson.loads,
+            connect_args={'check_same_thread': False, 'timeout': 5},
+            # WAL lets readers run alongside the writer, so keep enough
+            # connections for the request threads; LIFO reuses the warmest
+            # one (page cache, mmap) first
+            pool_size=10,
+            max_overflow=20,
+            pool_timeout=30,
+            pool_use_lifo=True
+        )
+        event.listen(engine, 'connect', self._configure_connection)
+        return engine
+
+    @staticmethod
+    def _configure_connection(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+        cursor.close()
+
+    def _upgrade_indexes(self):
+        """Bring indexes of databases created by older versions up to date"""
+        # create_all() skips tables that already exist, indexes included
+        for table in (Keystroke.__table__, PerformanceMetrics.__table__):
+            for index in table.indexes:
+                index.create(self.engine, checkfirst=True)
+        # Single-column indexes superseded by the composite ones
+        with self.engine.begin() as conn:
+            conn.execute(text("DROP INDEX IF EXISTS ix_keystrokes_session_id"))
+            conn.execute(text("DROP INDEX IF EXISTS ix_performance_metrics_session_id"))
     
     def get_session(self):
         return self.Session()
     
+    def remove_session(self):
+        """Close and discard the calling thread's session (request teardown,
+        end of each background write batch)"""
+        self.Session.remove()
+    
     def create_user_session(self):
         import uuid
         session_id = str(uuid.uuid4())
@@ -43,57 +131,47 @@ class DatabaseManager:
         user_session = UserSession(session_id=session_id)
         db_session.add(user_session)
         db_session.commit()
-        db_session.close()
         return session_id
     
-    def log_keystroke(self, session_id, key_data):
+    def bulk_insert(self, rows_by_model):
+        """Insert batches of row mappings ({model: [rows]}) in one transaction"""
         db_session = self.get_session()
-        keystroke = Keystroke(
-            session_id=session_id,
-            key_pressed=key_data['key_pressed'],
-            expected_key=key_data['expected_key'],
-            is_correct=key_data['is_correct'],
-            time_since_last=key_data.get('time_since_last'),
-            word_index=key_data.get('word_index'),
-            character_index=key_data.get('character_index'),
-            context=key_data.get('context'),
-            hand_used=key_data.get('hand_used'),
-            finger_used=key_data.get('finger_used')
-        )
-        db_session.add(keystroke)
+        for model, rows in rows_by_model.items():
+            db_session.bulk_insert_mappings(model, rows)
         db_session.commit()
-        db_session.close()
     
-    def update_user_session(self, session_id, updates):
+    def update_user_session(self, session_id, updates, progress=None):
+        """Apply session stat updates; `progress` (update_user_progress kwargs)
+        is written in the same transaction when given"""
         db_session = self.get_session()
-        session = db_session.query(UserSession).filter_by(session_id=session_id).first()
-        if session:
-            for key, value in updates.items():
-                setattr(session, key, value)
-            db_session.commit()
-        db_session.close()
+        # Single UPDATE; no SELECT round trip for the row first
+        db_session.execute(
+            update(UserSession).where(UserSession.session_id == session_id).values(**updates)
+        )
+        progress_row = self._apply_user_progress(db_session, **progress) if progress else None
+        db_session.commit()
+        if progress_row:
+            self._progress_cache[progress_row.user_id] = (time.time(), progress_row)
     
     def get_session_stats(self, session_id):
         db_session = self.get_session()
-        session = db_session.query(UserSession).filter_by(session_id=session_id).first()
-        db_session.close()
-        return session
+        return db_session.scalars(self._session_by_id, {'session_id': session_id}).first()
     
     def get_keystroke_history(self, session_id, limit=1000):
         db_session = self.get_session()
         keystrokes = db_session.query(Keystroke).filter_by(
             session_id=session_id
         ).order_by(Keystroke.timestamp.desc()).limit(limit).all()
-        db_session.close()
         return keystrokes
 
     def create_user(self, username, password):
+        # Hash (deliberately slow) before any transaction is open
+        password_hash = generate_password_hash(password)
         db_session = self.get_session()
         try:
             if db_session.query(User).filter_by(username=username).first():
                 return None  # User exists
             
-            password_hash = generate_password_hash(password)
             new_user = User(username=username, password_hash=password_hash)
             db_session.add(new_user)
             db_session.flush()
@@ -103,64 +181,90 @@ class DatabaseManager:
             db_session.add(progress)
             
             db_session.commit()
+            self._progress_cache.pop(new_user.id, None)
             return new_user.id
         except Exception:
             db_session.rollback()
             return None
-        finally:
-            db_session.close()
 
     def verify_user(self, username, password):
         db_session = self.get_session()
+        # Every login queries, unknown names included: a per-process name set
+        # misses users registered by other processes, and this lookup is one
+        # probe of the unique index on username
         user = db_session.query(User).filter_by(username=username).first()
-        db_session.close()
         
         if not user:
+            # Same hashing cost as a wrong password for a real user
+            check_password_hash(self._dummy_hash, password)
             return None
             
         if check_password_hash(user.password_hash, password):
             return user.id
         return None
 
+    def _cache_get(self, cache, user_id):
+        entry = cache.get(user_id)
+        if entry and time.time() - entry[0] < CACHE_TTL_SECONDS:
+            return entry[1]
+        return None
+
     def get_user_progress(self, user_id):
+        progress = self._cache_get(self._progress_cache, user_id)
+        if progress:
+            return progress
         db_session = self.get_session()
-        progress = db_session.query(UserProgress).filter_by(user_id=user_id).first()
-        db_session.close()
+        progress = db_session.execute(
+            select(*_PROGRESS_COLUMNS).where(UserProgress.user_id == user_id)
+        ).first()
+        if progress:
+            self._progress_cache[user_id] = (time.time(), progress)
         return progress
 
+    def _apply_user_progress(self, db_session, user_id, score_delta=0, wpm=0, level=None):
+        # One UPDATE ... RETURNING; the increment and the maxima are computed
+        # by SQLite against the stored row, not a previously loaded copy
+        values = {
+            'total_score': UserProgress.total_score + score_delta,
+            'max_wpm': func.max(func.coalesce(UserProgress.max_wpm, 0.0), wpm),
+            'last_login': datetime.utcnow()
+        }
+        if level:
+            # Ensure we capture the highest level achieved
+            values['current_level'] = func.max(func.coalesce(UserProgress.current_level, 1), level)
+        stmt = update(UserProgress).where(UserProgress.user_id == user_id).values(**values)
+        return db_session.execute(stmt.returning(*_PROGRESS_COLUMNS)).first()
+
     def update_user_progress(self, user_id, score_delta=0, wpm=0, level=None):
         db_session = self.get_session()
-        progress = db_session.query(UserProgress).filter_by(user_id=user_id).first()
+        progress = self._apply_user_progress(db_session, user_id, score_delta, wpm, level)
         if progress:
-            progress.total_score += score_delta
-            if wpm > progress.max_wpm:
-                progress.max_wpm = wpm
-            if level:
-                # Ensure we capture the highest level achieved
-                progress.current_level = max(progress.current_level, level)
-            progress.last_login = datetime.utcnow()
             db_session.commit()
-        db_session.close()
+            self._progress_cache[user_id] = (time.time(), progress)
 
     def get_user_analysis(self, user_id):
+        analysis = self._cache_get(self._analysis_cache, user_id)
+        if analysis:
+            return analysis
         db_session = self.get_session()
-        analysis = db_session.query(UserAnalysis).filter_by(user_id=user_id).first()
-        db_session.close()
+        analysis = db_session.execute(
+            select(*_ANALYSIS_COLUMNS).where(UserAnalysis.user_id == user_id)
+        ).first()
+        if analysis:
+            self._analysis_cache[user_id] = (time.time(), analysis)
         return analysis
 
     def update_user_analysis(self, user_id, data):
         db_session = self.get_session()
-        analysis = db_session.query(UserAnalysis).filter_by(user_id=user_id).first()
-        
-        if not analysis:
-            analysis = UserAnalysis(user_id=user_id)
-            db_session.add(analysis)
-        
-        # Update fields
-        for key, value in data.items():
-            if hasattr(analysis, key):
-                setattr(analysis, key, value)
+        # Only real columns; other snapshot keys are ignored
+        values = {key: value for key, value in data.items()
+                  if key in UserAnalysis.__table__.c and key != 'user_id'}
+        values['updated_at'] = datetime.utcnow()
         
-        analysis.updated_at = datetime.utcnow()
+        # One INSERT ... ON CONFLICT DO UPDATE ... RETURNING instead of a
+        # lookup followed by an insert or update
+        stmt = sqlite_insert(UserAnalysis).values(user_id=user_id, **values)
+        stmt = stmt.on_conflict_do_update(index_elements=['user_id'], set_=values)
+        analysis = db_session.execute(stmt.returning(*_ANALYSIS_COLUMNS)).one()
         db_session.commit()
-        db_session.close()
\ No newline at end of file
+        self._analysis_cache[user_id] = (time.time(), analysis)
@@ -1,25 +1,201 @@
+import atexit
+import logging
 import time
 import random
+import queue
+import threading
+from bisect import bisect_right
+from collections import Counter, defaultdict, OrderedDict
 from datetime import datetime
+from functools import partial
+from models import Keystroke, GameState
+from analyzer import FINGER_MAP_ANY_CASE
+
+logger = logging.getLogger(__name__)
 
 LEVEL_SCORE_STEP = 1000
+KEYSTROKE_BATCH_SIZE = 64
+MAX_ACTIVE_SESSIONS = 10000
+SESSION_IDLE_TTL = 1800  # seconds
+FLUSH_TIMEOUT = 30  # seconds
+
+# Write queue model marking a flush(); its item is the Event to set
+_FLUSH = object()
+
+UNKNOWN_FINGER = ('unknown', 'unknown')
+
+# (UserAnalysis attribute, focus area type, display priority)
+FOCUS_SPECS = (
+    ('weak_keys', 'high_error_keys', 'high'),
+    ('weak_fingers', 'weak_fingers', 'medium'),
+    ('slow_bigrams', 'slow_transitions', 'medium'),
+)
+
+# Faster typing = higher score, but with diminishing returns:
+# <50ms -> 20, <100ms -> 15, <200ms -> 12, <300ms -> 8, slower -> 5
+SPEED_THRESHOLDS = (0.05, 0.1, 0.2, 0.3)
+SPEED_SCORES = (20, 15, 12, 8, 5)
+
+def _score_kernel(time_since_last, combo_multiplier, correct_streak, is_correct):
+    """Score one keystroke; returns (char_score, new_combo, new_streak)"""
+    if not is_correct:
+        return 0, max(1, combo_multiplier - 0.2), 0
+
+    if time_since_last is None:
+        base_score = 10
+    else:
+        base_score = SPEED_SCORES[bisect_right(SPEED_THRESHOLDS, time_since_last)]
+
+    # Score uses the combo in effect before this keystroke
+    char_score = int(base_score * combo_multiplier)
+    correct_streak += 1
+    if correct_streak >= 10:
+        combo_multiplier = min(3, combo_multiplier + 0.1)
+    return char_score, combo_multiplier, correct_streak
+
+class SessionState:
+    """In-memory state of one active game session"""
+    __slots__ = (
+        'current_text', 'text_len', 'user_id', 'learn_mode', 'level',
+        'current_position', 'start_time', 'errors', 'correct_streak',
+        'max_streak', 'combo_multiplier', 'score', 'last_persisted_score',
+        'tier', 'last_analysis', 'last_analysis_time',
+        'keystroke_count', 'current_word_index', 'current_char_index',
+        'last_keystroke_time', 'generating', 'weak_keys', 'wpm_avg',
+        'last_snapshot_key', 'last_touch', 'unlocked_levels'
+    )
+
+    def __init__(self, current_text, user_id, level, score, tier, analysis):
+        now = time.time()
+        self.current_text = current_text
+        self.text_len = len(current_text)
+        self.user_id = user_id
+        self.learn_mode = True
+        self.level = level
+        self.current_position = 0
+        self.start_time = now
+        self.errors = 0
+        self.correct_streak = 0
+        self.max_streak = 0
+        self.combo_multiplier = 1
+        self.score = score  # Start with total score
+        self.last_persisted_score = score  # Track for delta updates
+        self.tier = tier
+        self.last_analysis = analysis
+        self.last_analysis_time = now
+        # Keystrokes typed on the current text (the rows themselves go
+        # straight to the writer queue)
+        self.keystroke_count = 0
+        self.current_word_index = 0
+        self.current_char_index = 0
+        self.last_keystroke_time = None
+        self.generating = False
+        # Cached analysis snapshot fields (None until known)
+        self.weak_keys = None
+        self.wpm_avg = None
+        self.last_snapshot_key = None
+        self.last_touch = now
+        # Session row's unlocked_levels, read on first stats request
+        self.unlocked_levels = None
+
+class SessionStore(OrderedDict):
+    """session_id -> SessionState, bounded by count and idle time.
+
+    Reading a session marks it as recently used. On every read and insert,
+    sessions idle for more than `ttl` seconds are dropped, and on insert so
+    are the least recently used ones beyond `maxsize`; `on_evict(session_id,
+    state)` runs for each. Request threads share the store, so changes to
+    it happen under a lock; `on_evict` runs outside it.
+    """
+
+    def __init__(self, maxsize, ttl, on_evict):
+        super().__init__()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self._lock = threading.RLock()
+
+    def __getitem__(self, session_id):
+        state = self.get(session_id)
+        if state is None:
+            raise KeyError(session_id)
+        return state
+
+    def get(self, session_id, default=None):
+        """The session (a read, like store[session_id]), or `default` if
+        there is none. Checking and fetching happen under one lock hold, so
+        a concurrent eviction can't slip in between."""
+        with self._lock:
+            if session_id not in self:
+                return default
+            state = super().__getitem__(session_id)
+            self.move_to_end(session_id)
+            state.last_touch = time.time()
+            evicted = self._evict_locked()
+        self._run_on_evict(evicted)
+        return state
+
+    def __setitem__(self, session_id, state):
+        with self._lock:
+            super().__setitem__(session_id, state)
+            self.move_to_end(session_id)
+            evicted = self._evict_locked()
+        self._run_on_evict(evicted)
+
+    def _evict_locked(self):
+        """Unlink expired and surplus sessions (oldest first, never the
+        most recent one); returns them for _run_on_evict"""
+        evicted = []
+        cutoff = time.time() - self.ttl
+        while len(self) > 1:
+            oldest_id, oldest = next(iter(self.items()))
+            if len(self) <= self.maxsize and oldest.last_touch >= cutoff:
+                break
+            evicted.append((oldest_id, oldest))
+            super().__delitem__(oldest_id)
+        return evicted
+
+    def _run_on_evict(self, evicted):
+        for session_id, state in evicted:
+            self.on_evict(session_id, state)
+
+    def pop(self, session_id, *default):
+        with self._lock:
+            return super().pop(session_id, *default)
+
+    def values(self):
+        """Snapshot of the sessions, safe to iterate while others change"""
+        with self._lock:
+            return list(super().values())
 
 class GameEngine:
     def __init__(self, db_manager, analyzer, text_generator):
         self.db = db_manager
         self.analyzer = analyzer
         self.text_generator = text_generator
-        self.active_sessions = {}  # session_id -> game state
+        self.active_sessions = SessionStore(MAX_ACTIVE_SESSIONS, SESSION_IDLE_TTL,
+                                            self._finalize_session)
+
+        # Every write that returns nothing to the caller goes through one
+        # background writer, so SQLite only ever sees a single writer.
+        # Keystrokes and text history are queued as (model, row, owner) and
+        # bulk inserted; updates are queued as (None, call, owner). The
+        # owner is the queuing thread, which flush() tells about failures
+        self._write_queue = queue.Queue()
+        self._failed_writes = Counter()  # owner -> writes dropped since its last flush
+        self._failed_lock = threading.Lock()
+        self._writer = threading.Thread(target=self._writer_loop, daemon=True)
+        self._writer.start()
+        # The writer is a daemon thread; land whatever it still holds on exit
+        atexit.register(self.flush)
     
     def start_session(self, session_id, user_id):
-        """Initialize a new game session"""
-        # FIX #2: Mandatory user_id and Type Check
-        if user_id is not None:
-            user_id = int(user_id)
-
+        """Initialize a new game session (user_id is an int, or None for guests)"""
         if session_id not in self.active_sessions:
             # FIX #3: Load full user state from DB
             if user_id:
+                # Read progress/analysis only after queued writes land
+                self.flush()
                 progress = self.db.get_user_progress(user_id)
                 if not progress:
                     raise Exception("User progress not found")
@@ -34,24 +210,26 @@ class GameEngine:
                 user_analysis = None
             
             mastered_items = []
+            focus_areas = []
+            restored_focus = []
             if user_analysis:
                 # Restore state from DB
                 mode = user_analysis.tier
-                focus_areas = []
                 
-                # Reconstruct focus areas from snapshot
-                if user_analysis.weak_keys:
-                    focus_areas.append({'type': 'high_error_keys', 'items': user_analysis.weak_keys})
-                if user_analysis.weak_fingers:
-                    focus_areas.append({'type': 'weak_fingers', 'items': user_analysis.weak_fingers})
+                # Reconstruct focus areas from snapshot, for the generator
+                # and (with priorities) for the frontend display
+                for attr, area_type, priority in FOCUS_SPECS:
+                    items = getattr(user_analysis, attr)
+                    if items:
+                        focus_areas.append({'type': area_type, 'items': items})
+                        restored_focus.append({'type': area_type, 'items': items, 'priority': priority})
             else:
                 # New user or no analysis yet
                 mode = 'controlled'
-                focus_areas = []
                 
                 # Create default snapshot
                 if user_id:
-                    self.db.update_user_analysis(user_id, {
+                    self._queue_write(self.db.update_user_analysis, user_id, {
                         'tier': 'controlled',
                         'accuracy_avg': 100.0
                     })
@@ -67,45 +245,24 @@ class GameEngine:
             # Prepare initial analysis state from persistence
             initial_analysis = self.analyzer.get_default_analysis()
             if user_analysis:
-                # Reconstruct focus areas for the frontend display
-                restored_focus = []
-                if user_analysis.weak_keys:
-                    restored_focus.append({'type': 'high_error_keys', 'items': user_analysis.weak_keys, 'priority': 'high'})
-                if user_analysis.weak_fingers:
-                    restored_focus.append({'type': 'weak_fingers', 'items': user_analysis.weak_fingers, 'priority': 'medium'})
-                if user_analysis.slow_bigrams:
-                    restored_focus.append({'type': 'slow_transitions', 'items': user_analysis.slow_bigrams, 'priority': 'medium'})
-                
                 initial_analysis['focus_areas'] = restored_focus
                 initial_analysis['overall']['accuracy'] = user_analysis.accuracy_avg / 100.0
                 initial_analysis['overall']['wpm'] = user_analysis.wpm_avg
                 initial_analysis['insights'] = ["Welcome back! We've restored your training profile."]
             
             # Initialize game state
-            self.active_sessions[session_id] = {
-                'current_text': initial_text,
-                'user_id': user_id,
-                'learn_mode': True,
-                'level': progress.current_level,
-                'current_position': 0,
-                'start_time': time.time(),
-                'errors': 0,
-                'correct_streak': 0,
-                'max_streak': 0,
-                'combo_multiplier': 1,
-                'score': progress.total_score, # Start with total score
-                'last_persisted_score': progress.total_score, # Track for delta updates
-                'text_history': [],
-                'tier': mode,
-                'last_analysis': initial_analysis,
-                'last_analysis_time': time.time(),
-                'typed_chars': [],
-                'current_word_index': 0,
-                'current_char_index': 0
-            }
+            state = SessionState(initial_text, user_id, progress.current_level,
+                                 progress.total_score, mode, initial_analysis)
+
+            # Cache the snapshot fields generate_new_text needs
+            if user_id:
+                state.weak_keys = user_analysis.weak_keys if user_analysis else []
+                state.wpm_avg = user_analysis.wpm_avg if user_analysis else 0.0
+            self.active_sessions[session_id] = state
             
             print("BACKEND TEXT (START):", repr(initial_text))
-            self.db.update_user_session(session_id, {'current_level': progress.current_level})
+            self._queue_write(self.db.update_user_session, session_id,
+                              {'current_level': progress.current_level})
             
             return {
                 'text': initial_text,
@@ -118,72 +275,74 @@ class GameEngine:
     
     def process_keystroke(self, session_id, key_pressed, timestamp=None):
         """Process a single keystroke"""
-        if session_id not in self.active_sessions:
+        state = self.active_sessions.get(session_id)
+        if state is None:
             return {'error': 'Session not found'}
         
-        state = self.active_sessions[session_id]
-        
         # DEBUG: Verified text sync. Commenting out to reduce noise.
-        # print("BACKEND TEXT:", repr(state['current_text']))
+        # print("BACKEND TEXT:", repr(state.current_text))
         
         if timestamp is None:
             timestamp = time.time()
         
         # Calculate time since last keystroke
-        if 'last_keystroke_time' in state:
-            time_since_last = timestamp - state['last_keystroke_time']
-        else:
-            time_since_last = None
+        last = state.last_keystroke_time
+        time_since_last = timestamp - last if last is not None else None
         
         # Get expected character
-        expected_char = state['current_text'][state['current_position']] if state['current_position'] < len(state['current_text']) else ''
+        expected_char = state.current_text[state.current_position] if state.current_position < state.text_len else ''
         
         # Determine correctness
         is_correct = (key_pressed == expected_char)
         
         # DEBUG: Log exact comparison to catch frontend key transformation bugs
-        print(f"COMPARE: Input={repr(key_pressed)} (len={len(key_pressed) if isinstance(key_pressed, str) else 'N/A'}) vs Expected={repr(expected_char)} -> {'MATCH' if is_correct else 'MISMATCH'}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("COMPARE: Input=%r (len=%s) vs Expected=%r -> %s",
+                         key_pressed, len(key_pressed) if isinstance(key_pressed, str) else 'N/A',
+                         expected_char, 'MATCH' if is_correct else 'MISMATCH')
         
-        learn_mode = state.get('learn_mode', True)
+        learn_mode = state.learn_mode
         
         # Update game state
+        char_score, state.combo_multiplier, state.correct_streak = _score_kernel(
+            time_since_last, state.combo_multiplier, state.correct_streak, is_correct
+        )
         if is_correct:
-            state['current_position'] += 1
-            state['correct_streak'] += 1
-            state['max_streak'] = max(state['max_streak'], state['correct_streak'])
-            
-            # Calculate score for this keystroke
-            char_score = self._calculate_char_score(time_since_last, state['combo_multiplier'])
-            state['score'] += char_score
-            
-            # Update combo multiplier
-            if state['correct_streak'] >= 10:
-                state['combo_multiplier'] = min(3, state['combo_multiplier'] + 0.1)
+            state.current_position += 1
+            state.max_streak = max(state.max_streak, state.correct_streak)
+            state.score += char_score
         else:
-            state['errors'] += 1
-            state['correct_streak'] = 0
-            state['combo_multiplier'] = max(1, state['combo_multiplier'] - 0.2)
+            state.errors += 1
             
             if not learn_mode:
                 # Free Mode: Advance position even on error
-                state['current_position'] += 1
+                state.current_position += 1
         
         # Store keystroke data
+        hand_used, finger_used = FINGER_MAP_ANY_CASE.get(expected_char, UNKNOWN_FINGER)
+        # Context: previous 2 chars + current char
+        pos = state.current_position
+        context = state.current_text[pos - 2:pos + 1] if pos >= 2 else state.current_text[:pos + 1]
         keystroke_data = {
             'key_pressed': key_pressed,
             'expected_key': expected_char,
             'is_correct': is_correct,
             'time_since_last': time_since_last,
-            'word_index': state['current_word_index'],
-            'character_index': state['current_char_index'],
-            'context': self._get_context(state['current_text'], state['current_position']),
-            'hand_used': self.analyzer.finger_map.get(expected_char.lower(), ('unknown', 'unknown'))[0],
-            'finger_used': self.analyzer.finger_map.get(expected_char.lower(), ('unknown', 'unknown'))[1]
+            'word_index': state.current_word_index,
+            'character_index': state.current_char_index,
+            'context': context,
+            'hand_used': hand_used,
+            'finger_used': finger_used
         }
         
-        self.db.log_keystroke(session_id, keystroke_data)
-        state['typed_chars'].append(keystroke_data)
-        state['last_keystroke_time'] = timestamp
+        # Queue the row; the writer thread inserts it in bulk
+        self._queue_row(Keystroke, {
+            'session_id': session_id,
+            **keystroke_data,
+            'timestamp': datetime.utcnow()
+        })
+        state.keystroke_count += 1
+        state.last_keystroke_time = timestamp
         
         # Learn Mode: Block progression on error
         if not is_correct and learn_mode:
@@ -197,121 +356,216 @@ class GameEngine:
         # Update character/word indices
         # Advance indices if correct OR if we are in Free Mode (where we advanced position anyway)
         if is_correct or (not is_correct and not learn_mode):
-            if expected_char == ' ' or state['current_position'] >= len(state['current_text']):
-                state['current_word_index'] += 1
-                state['current_char_index'] = 0
+            if expected_char == ' ' or state.current_position >= state.text_len:
+                state.current_word_index += 1
+                state.current_char_index = 0
             else:
-                state['current_char_index'] += 1
+                state.current_char_index += 1
         
         # Check if text is complete
-        is_complete = state['current_position'] >= len(state['current_text'])
+        is_complete = state.current_position >= state.text_len
         
         new_text = None
-        current_pos_for_response = state['current_position']
+        current_pos_for_response = state.current_position
+        
+        # Update database with session stats. Nothing reads the session row
+        # mid-text, so it is only written on level-ups, completed texts and
+        # when the session ends
+        level_up = 1 + (state.score // LEVEL_SCORE_STEP) > state.level
+        if is_complete or level_up:
+            self._update_session_stats(session_id, state)
         
         # Update persistent user progress on completion
         if is_complete:
+            # Finished texts are a checkpoint: wait until the keystrokes,
+            # stats and progress queued so far are written
             self._persist_user(state, wpm=self._calculate_wpm(state))
+            self.flush()
             # FIX 3: Disable auto-generation to prevent race conditions.
             # Frontend must explicitly request new text via /api/new_text
             # self._on_text_complete(session_id)
-            # new_text = state['current_text']
+            # new_text = state.current_text
 
-        # Update database with session stats
-        self._update_session_stats(session_id)
-        
         return {
             'correct': is_correct,
             'position': current_pos_for_response,
-            'streak': state['correct_streak'],
-            'max_streak': state['max_streak'],
-            'combo_multiplier': state['combo_multiplier'],
-            'score': state['score'],
-            'errors': state['errors'],
+            'streak': state.correct_streak,
+            'max_streak': state.max_streak,
+            'combo_multiplier': state.combo_multiplier,
+            'score': state.score,
+            'errors': state.errors,
             'is_complete': is_complete,
             'expected_char': expected_char,
             'time_since_last_ms': time_since_last * 1000 if time_since_last else None,
             'new_text': new_text
         }
     
-    def _calculate_wpm(self, state):
-        elapsed = (time.time() - state['start_time']) / 60
-        return (state['current_position'] / 5) / elapsed if elapsed > 0 else 0
+    def _queue_write(self, call, *args, **kwargs):
+        """Run a DB write on the background writer, in submission order"""
+        self._write_queue.put_nowait((None, partial(call, *args, **kwargs), threading.get_ident()))
 
-    def _calculate_char_score(self, time_since_last, combo_multiplier):
-        """Calculate score for a correctly typed character"""
-        if time_since_last is None:
-            base_score = 10
-        else:
-            # Faster typing = higher score, but with diminishing returns
-            if time_since_last < 0.05:  # 50ms
-                base_score = 20
-            elif time_since_last < 0.1:  # 100ms
-                base_score = 15
-            elif time_since_last < 0.2:  # 200ms
-                base_score = 12
-            elif time_since_last < 0.3:  # 300ms
-                base_score = 8
+    def _queue_row(self, model, row):
+        """Queue a row for the writer's next bulk insert"""
+        self._write_queue.put_nowait((model, row, threading.get_ident()))
+
+    def _writer_loop(self):
+        """Background loop that drains queued writes in batches.
+
+        Nothing a batch raises may end the thread (flush() would then wait
+        in vain), and its flush markers are released however it ends.
+        """
+        while True:
+            batch = [self._write_queue.get()]
+            while len(batch) < KEYSTROKE_BATCH_SIZE:
+                try:
+                    batch.append(self._write_queue.get_nowait())
+                except queue.Empty:
+                    break
+            markers = [entry[1] for entry in batch if entry[0] is _FLUSH]
+            try:
+                self._write_batch(batch)
+            except Exception:
+                logger.exception("Background write batch failed")
+                self._record_failure(entry[-1] for entry in batch)
+            finally:
+                for done in markers:
+                    done.set()
+
+    def _write_batch(self, batch):
+        """Bulk insert a batch's rows, then run its calls in order (a flush
+        marker is released in its place among them)"""
+        rows_by_model = defaultdict(list)
+        row_owners = set()
+        calls = []
+        for model, item, owner in batch:
+            if model is None:
+                calls.append((item, owner))
+            elif model is _FLUSH:
+                calls.append((item.set, owner))
             else:
-                base_score = 5
-        
-        return int(base_score * combo_multiplier)
-    
-    def _get_context(self, text, position):
-        """Get context (previous 2 chars + current char)"""
-        start = max(0, position - 2)
-        end = min(len(text), position + 1)
-        return text[start:end]
-    
+                rows_by_model[model].append(item)
+                row_owners.add(owner)
+        try:
+            if rows_by_model:
+                self._apply_write(row_owners, self.db.bulk_insert, rows_by_model)
+            for call, owner in calls:
+                self._apply_write((owner,), call)
+        finally:
+            # Start each batch from a fresh session (no stale identity map)
+            self.db.remove_session()
+
+    def _apply_write(self, owners, call, *args):
+        """Run one queued write; a failure is logged, rolled back and
+        recorded against the threads that queued it"""
+        try:
+            call(*args)
+        except Exception:
+            # The failed write is dropped on purpose: retrying it here would
+            # stall every write queued behind it if the failure persists
+            logger.exception("Background write failed, dropping it: %r",
+                             getattr(getattr(call, 'func', call), '__name__', call))
+            self.db.remove_session()
+            self._record_failure(owners)
+
+    def _record_failure(self, owners):
+        with self._failed_lock:
+            self._failed_writes.update(set(owners))
+
+    def flush(self, timeout=FLUSH_TIMEOUT):
+        """Block until every write queued before this call has been applied.
+
+        Waits on a marker queued behind them rather than on the whole queue,
+        so writes other sessions queue meanwhile don't hold the caller up.
+        Returns False (and logs why) if the writer has stopped, does not
+        reach the marker within `timeout` seconds, or dropped a write this
+        thread queued since its last flush.
+        """
+        if not self._writer.is_alive():
+            logger.error("Background writer is not running; writes are not being applied")
+            return False
+        done = threading.Event()
+        owner = threading.get_ident()
+        self._write_queue.put_nowait((_FLUSH, done, owner))
+        deadline = time.monotonic() + timeout
+        # Wake up now and then to notice a writer that died meanwhile
+        while not done.wait(min(1.0, max(0.0, deadline - time.monotonic()))):
+            if not self._writer.is_alive():
+                logger.error("Background writer stopped before flush completed")
+                return False
+            if time.monotonic() >= deadline:
+                logger.error("Background writer did not flush within %s seconds", timeout)
+                return False
+        with self._failed_lock:
+            failed = self._failed_writes.pop(owner, 0)
+        if failed:
+            logger.error("%d queued write(s) failed and were dropped", failed)
+        return not failed
+
+    def _calculate_wpm(self, state):
+        elapsed = (time.time() - state.start_time) / 60
+        return (state.current_position / 5) / elapsed if elapsed > 0 else 0
+
     def _on_text_complete(self, session_id):
         """Handles text completion exactly once"""
         self.generate_new_text(session_id)
 
     def generate_new_text(self, session_id):
         """Generate new adaptive text"""
-        state = self.active_sessions[session_id]
+        state = self.active_sessions.get(session_id)
+        if state is None:
+            return
         
         print(f"GENERATING NEW TEXT for {session_id}")
         
         # Safety lock to prevent double generation
-        if state.get("generating"):
+        if state.generating:
             return
-        state["generating"] = True
+        state.generating = True
         
+        # Make sure the analyzer sees every keystroke typed so far
+        self.flush()
+
         # Analyze recent performance
         current_time = time.time()
         
         # Update analysis at checkpoints (every 30s or after text completion)
-        if current_time - state['last_analysis_time'] > 30 or len(state['typed_chars']) > 50:
+        if current_time - state.last_analysis_time > 30 or state.keystroke_count > 50:
             # 1. Analyze current session
             session_analysis = self.analyzer.analyze_session(session_id, recent_only=False)
             
             # 2. Build stable snapshot
             snapshot = self.analyzer.build_analysis_snapshot(session_analysis)
             
-            # 3. Update persistent DB state
-            if state.get('user_id'):
-                self.db.update_user_analysis(state['user_id'], snapshot)
+            # 3. Update persistent DB state, skipping the write when the
+            # profile has not materially changed since the last one (the
+            # averages count once they move by a whole WPM / percent point)
+            if state.user_id:
+                snapshot_key = (snapshot['tier'], tuple(snapshot['weak_keys']),
+                                tuple(snapshot['weak_fingers']), tuple(snapshot['slow_bigrams']),
+                                round(snapshot['wpm_avg']), round(snapshot['accuracy_avg']))
+                if snapshot_key != state.last_snapshot_key:
+                    self._queue_write(self.db.update_user_analysis, state.user_id, snapshot)
+                    state.last_snapshot_key = snapshot_key
+                state.weak_keys = snapshot['weak_keys']
+                state.wpm_avg = snapshot['wpm_avg']
             
             # 4. Update local state
-            state['tier'] = snapshot['tier']
-            state['last_analysis'] = session_analysis
-            state['last_analysis_time'] = current_time
-
-        # Prepare focus areas for generator
-        user_analysis = None
-        if state.get('user_id'):
-            user_analysis = self.db.get_user_analysis(state['user_id'])
+            state.tier = snapshot['tier']
+            state.last_analysis = session_analysis
+            state.last_analysis_time = current_time
+
+        # Prepare focus areas for generator from the session's snapshot
+        # fields (set by start_session and refreshed above)
         focus_areas = []
-        if user_analysis and user_analysis.weak_keys:
-            focus_areas.append({'type': 'high_error_keys', 'items': user_analysis.weak_keys})
+        if state.weak_keys:
+            focus_areas.append({'type': 'high_error_keys', 'items': state.weak_keys})
         
-        # Determine current WPM (check DB profile first, then local session stats)
+        # Determine current WPM (check cached profile first, then local session stats)
         current_wpm = 0
-        if user_analysis:
-            current_wpm = user_analysis.wpm_avg
-        elif state.get('last_analysis'):
-            current_wpm = state['last_analysis'].get('overall', {}).get('wpm', 0)
+        if state.wpm_avg is not None:
+            current_wpm = state.wpm_avg
+        elif state.last_analysis:
+            current_wpm = state.last_analysis.get('overall', {}).get('wpm', 0)
 
         # Adjust length based on performance
         if current_wpm > 200:  # Grandmaster typist
@@ -328,110 +582,138 @@ class GameEngine:
             length = random.randint(10, 15)
         
         new_text = self.text_generator.generate_text(
-            mode=state['tier'],
+            mode=state.tier,
             length_words=length,
             focus_areas=focus_areas,
             mastered_items=[]
         )
         
-        # Save old text to history
-        state['text_history'].append({
-            'text': state['current_text'],
-            'score': state['score'],
-            'errors': state['errors'],
-            'timestamp': datetime.utcnow().isoformat()
+        # Save old text to history (persisted, not kept in memory)
+        self._queue_row(GameState, {
+            'session_id': session_id,
+            'state_type': 'text_history',
+            'state_data': {
+                'text': state.current_text,
+                'score': state.score,
+                'errors': state.errors,
+                'timestamp': time.time()  # Epoch seconds; format when displayed
+            }
         })
         
         # Reset for new text
-        state['current_text'] = new_text
+        state.current_text = new_text
+        state.text_len = len(new_text)
         print("BACKEND TEXT (NEW):", repr(new_text))
-        state['current_position'] = 0
-        state['typed_chars'] = []
-        state['current_word_index'] = 0
-        state['current_char_index'] = 0
+        state.current_position = 0
+        state.keystroke_count = 0
+        state.current_word_index = 0
+        state.current_char_index = 0
         
-        state["generating"] = False
+        state.generating = False
     
-    def _update_session_stats(self, session_id):
+    def _update_session_stats(self, session_id, state):
         """Update session statistics in database"""
-        state = self.active_sessions[session_id]
-        
         updates = {
-            'total_words': state['current_word_index'],
-            'total_characters': state['current_position'],
-            'total_errors': state['errors'],
-            'total_time_seconds': time.time() - state['start_time'],
-            'current_score': state['score'],
-            'highest_streak': state['max_streak']
+            'total_words': state.current_word_index,
+            'total_characters': state.current_position,
+            'total_errors': state.errors,
+            'total_time_seconds': time.time() - state.start_time,
+            'current_score': state.score,
+            'highest_streak': state.max_streak
         }
         
         # FIX: Level logic based on TOTAL score
-        new_level = 1 + (state['score'] // LEVEL_SCORE_STEP)
+        new_level = 1 + (state.score // LEVEL_SCORE_STEP)
+        progress = None
 
-        if new_level > state['level']:
-            state['level'] = new_level
+        if new_level > state.level:
+            state.level = new_level
             updates['current_level'] = new_level
             
-            # Update persistent user progress immediately
-            self._persist_user(state)
+            # Update persistent user progress immediately, in the same
+            # transaction as the session stats
+            if state.user_id:
+                progress = {
+                    'user_id': state.user_id,
+                    'level': state.level,
+                    'score_delta': state.score - state.last_persisted_score
+                }
+                state.last_persisted_score = state.score
         
-        self.db.update_user_session(session_id, updates)
+        self._queue_write(self.db.update_user_session, session_id, updates, progress)
     
     def _persist_user(self, state, wpm=0):
         """Helper to save user progress with correct score delta"""
-        if not state.get('user_id'):
+        if not state.user_id:
             return
 
-        current_total = state['score']
-        last_saved = state.get('last_persisted_score', 0)
+        current_total = state.score
+        last_saved = state.last_persisted_score
         delta = current_total - last_saved
         
-        if delta > 0 or wpm > 0 or state['level'] > 0:
-            self.db.update_user_progress(
-                user_id=state['user_id'],
-                level=state['level'],
+        if delta > 0 or wpm > 0 or state.level > 0:
+            self._queue_write(
+                self.db.update_user_progress,
+                user_id=state.user_id,
+                level=state.level,
                 score_delta=delta,
                 wpm=wpm
             )
             # Update the checkpoint
-            state['last_persisted_score'] = current_total
+            state.last_persisted_score = current_total
+
+    def _finalize_session(self, session_id, state):
+        """Queue out everything a session still holds before it is dropped.
+
+        Runs inside whichever request triggered the eviction, so it does not
+        wait for the writes to land.
+        """
+        self._update_session_stats(session_id, state)
+        self._persist_user(state)
 
     def force_save_user(self, user_id):
-        """Force save user progress from active session"""
+        """Force save user progress from active session; returns False if
+        the write did not land"""
         if not user_id:
-            return
+            return True
         # Find active session for this user
+        uid = int(user_id)
         for session in self.active_sessions.values():
-            if session.get('user_id') == int(user_id):
+            if session.user_id == uid:
                 self._persist_user(session)
-                return
+                return self.flush()
+        return True
 
     def _get_session_stats(self, session_id):
         """Get current session statistics"""
-        if session_id in self.active_sessions:
-            state = self.active_sessions[session_id]
-            db_stats = self.db.get_session_stats(session_id)
+        state = self.active_sessions.get(session_id)
+        if state is not None:
+            if state.unlocked_levels is None:
+                db_stats = self.db.get_session_stats(session_id)
+                state.unlocked_levels = db_stats.unlocked_levels if db_stats else [1]
             
-            elapsed = time.time() - state['start_time']
-            wpm = (state['current_position'] / 5) / (elapsed / 60) if elapsed > 0 else 0
-            accuracy = (state['current_position'] - state['errors']) / state['current_position'] if state['current_position'] > 0 else 0
+            elapsed = time.time() - state.start_time
+            wpm = (state.current_position / 5) / (elapsed / 60) if elapsed > 0 else 0
+            accuracy = (state.current_position - state.errors) / state.current_position if state.current_position > 0 else 0
             
             return {
-                'score': state['score'],
-                'streak': state['correct_streak'],
-                'max_streak': state['max_streak'],
-                'combo_multiplier': state['combo_multiplier'],
-                'errors': state['errors'],
+                'score': state.score,
+                'streak': state.correct_streak,
+                'max_streak': state.max_streak,
+                'combo_multiplier': state.combo_multiplier,
+                'errors': state.errors,
                 'wpm': wpm,
                 'accuracy': accuracy,
-                'level': db_stats.current_level if db_stats else 1,
-                'unlocked_levels': db_stats.unlocked_levels if db_stats else [1]
+                # state.level is written through on every level-up, so it
+                # matches the session row's current_level
+                'level': state.level,
+                'unlocked_levels': state.unlocked_levels
             }
         return {}
     
     def get_analysis(self, session_id):
         """Get current analysis for the session"""
-        if session_id in self.active_sessions:
-            state = self.active_sessions[session_id]
-            return state.get('last_analysis', self.analyzer.get_default_analysis())
+        state = self.active_sessions.get(session_id)
+        if state is not None:
+            return state.last_analysis
         return self.analyzer.get_default_analysis()
\ No newline at end of file
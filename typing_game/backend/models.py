@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, Boolean, JSON, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Text, Boolean, JSON, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship, backref
 import json
@@ -23,9 +23,11 @@ class UserSession(Base):
 
 class Keystroke(Base):
     __tablename__ = 'keystrokes'
+    # Serves session_id lookups ordered by timestamp without a sort step
+    __table_args__ = (Index('ix_keystroke_sid_ts', 'session_id', 'timestamp'),)
     
     id = Column(Integer, primary_key=True)
-    session_id = Column(String(36), nullable=False, index=True)
+    session_id = Column(String(36), nullable=False)
     timestamp = Column(DateTime, default=datetime.utcnow)
     key_pressed = Column(String(1), nullable=False)
     expected_key = Column(String(1), nullable=False)
@@ -39,9 +41,10 @@ class Keystroke(Base):
 
 class PerformanceMetrics(Base):
     __tablename__ = 'performance_metrics'
+    __table_args__ = (Index('ix_perf_sid_type', 'session_id', 'metric_type'),)
     
     id = Column(Integer, primary_key=True)
-    session_id = Column(String(36), nullable=False, index=True)
+    session_id = Column(String(36), nullable=False)
     metric_date = Column(DateTime, default=datetime.utcnow)
     metric_type = Column(String(50), nullable=False)  # 'key_accuracy', 'bigram_speed', etc.
     metric_name = Column(String(10), nullable=False)  # e.g., 'e', 'er', 'th'
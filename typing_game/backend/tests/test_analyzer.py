@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from analyzer import TypingAnalyzer
+from database import DatabaseManager
+from models import Keystroke
+
+
+class EndOfTextKeystrokeTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.db = DatabaseManager(os.path.join(self.tmp, 'test.db'))
+        self.analyzer = TypingAnalyzer(self.db)
+
+    def tearDown(self):
+        self.db.remove_session()
+        self.db.engine.dispose()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_empty_expected_keys_keep_columns_aligned(self):
+        # Keys typed past the end of a text are stored with expected_key ''
+        text = 'the quick brown fox'
+        start = datetime.utcnow() - timedelta(minutes=5)
+        rows = []
+        for i, ch in enumerate(text + 'xyz'):
+            expected = text[i] if i < len(text) else ''
+            rows.append(dict(session_id='s1', timestamp=start + timedelta(seconds=i),
+                             key_pressed=ch if i % 7 else 'q', expected_key=expected,
+                             is_correct=ch == expected and i % 7 != 0,
+                             time_since_last=0.2))
+        self.db.bulk_insert({Keystroke: rows})
+
+        analysis = self.analyzer.analyze_session('s1')
+        self.assertEqual(analysis['overall']['total_keystrokes'], len(rows))
+
+    def test_empty_expected_keys_group_as_unknown(self):
+        start = datetime.utcnow() - timedelta(minutes=5)
+        rows = [dict(session_id='s2', timestamp=start + timedelta(seconds=i),
+                     key_pressed='x', expected_key='f' if i % 2 else '',
+                     is_correct=False, time_since_last=0.2)
+                for i in range(12)]
+        self.db.bulk_insert({Keystroke: rows})
+
+        analysis = self.analyzer.analyze_session('s2')
+        self.assertEqual(analysis['finger_level']['unknown']['sample_size'], 6)
+        self.assertEqual(analysis['finger_level']['index']['sample_size'], 6)
+        self.assertEqual(analysis['hand_level']['left']['sample_size'], 6)
+
+
+class CaseFoldingTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.db = DatabaseManager(os.path.join(self.tmp, 'test.db'))
+        self.analyzer = TypingAnalyzer(self.db)
+
+    def tearDown(self):
+        self.db.remove_session()
+        self.db.engine.dispose()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_non_ascii_keys_fold_like_str_lower(self):
+        start = datetime.utcnow() - timedelta(minutes=5)
+        keys = 'ÉéÉxéÉ' * 3
+        rows = [dict(session_id='s1', timestamp=start + timedelta(seconds=i),
+                     key_pressed=key, expected_key=key, is_correct=True, time_since_last=0.2)
+                for i, key in enumerate(keys)]
+        self.db.bulk_insert({Keystroke: rows})
+
+        analysis = self.analyzer.analyze_session('s1')
+        self.assertEqual(list(analysis['key_level']), ['é', 'x'])
+        self.assertEqual(analysis['key_level']['é']['sample_size'], 15)
+        self.assertIn('éé', analysis['bigram_level'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+
+class EndOfTextFlowTest(unittest.TestCase):
+    """Keys typed past the end of a text are stored with expected_key ''"""
+
+    @classmethod
+    def setUpClass(cls):
+        # The app opens data/user_data.db relative to the working directory
+        cls.cwd = os.getcwd()
+        cls.tmp = tempfile.mkdtemp()
+        os.chdir(cls.tmp)
+        import app
+        cls.app = app
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app.game_engine.flush()
+        cls.app.db_manager.remove_session()
+        cls.app.db_manager.engine.dispose()
+        os.chdir(cls.cwd)
+        shutil.rmtree(cls.tmp, ignore_errors=True)
+
+    def type_past_end(self, client, session_id, text, extra=6):
+        for key in text + 'x' * extra:
+            client.post('/api/keystroke', json={'session_id': session_id, 'key': key,
+                                                'timestamp': time.time()})
+
+    def test_guest_texts_after_typing_past_the_end(self):
+        client = self.app.app.test_client()
+        data = client.post('/api/start_session').get_json()
+        session_id = data['session_id']
+        for _ in range(3):
+            self.type_past_end(client, session_id, data['text'])
+            response = client.get('/api/new_text/' + session_id)
+            self.assertEqual(response.status_code, 200)
+            data = response.get_json()
+        self.assertEqual(client.get('/api/analysis/' + session_id).status_code, 200)
+        self.assertEqual(client.get('/api/stats/' + session_id).status_code, 200)
+
+    def test_user_texts_after_typing_past_the_end(self):
+        client = self.app.app.test_client()
+        credentials = {'username': 'typist', 'password': 'secret'}
+        self.assertEqual(client.post('/api/register', json=credentials).status_code, 200)
+        self.assertEqual(client.post('/api/login', json=credentials).status_code, 200)
+        data = client.post('/api/start_session').get_json()
+        session_id = data['session_id']
+        for _ in range(3):
+            self.type_past_end(client, session_id, data['text'])
+            response = client.get('/api/new_text/' + session_id)
+            self.assertEqual(response.status_code, 200)
+            data = response.get_json()
+        self.assertEqual(client.get('/api/analysis/' + session_id).status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
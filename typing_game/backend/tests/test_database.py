@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from sqlalchemy import inspect
+from sqlalchemy.exc import NoInspectionAvailable
+
+from database import DatabaseManager
+
+
+class VerifyUserTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        path = os.path.join(self.tmp, 'test.db')
+        self.db = DatabaseManager(path)
+        # A second manager on the same file stands in for another process
+        self.other = DatabaseManager(path)
+
+    def tearDown(self):
+        for db in (self.db, self.other):
+            db.remove_session()
+            db.engine.dispose()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_user_registered_elsewhere_can_log_in(self):
+        user_id = self.other.create_user('alice', 'secret')
+        self.assertIsNotNone(user_id)
+        self.assertEqual(self.db.verify_user('alice', 'secret'), user_id)
+        self.assertIsNone(self.db.verify_user('alice', 'wrong'))
+
+    def test_unknown_user_is_rejected(self):
+        self.assertIsNone(self.db.verify_user('nobody', 'secret'))
+
+
+class UserCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.db = DatabaseManager(os.path.join(self.tmp, 'test.db'))
+        self.user_id = self.db.create_user('bob', 'secret')
+
+    def tearDown(self):
+        self.db.remove_session()
+        self.db.engine.dispose()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def assertNotMapped(self, value):
+        with self.assertRaises(NoInspectionAvailable):
+            inspect(value)
+
+    def test_cached_progress_is_plain_data(self):
+        progress = self.db.get_user_progress(self.user_id)
+        self.assertNotMapped(progress)
+        self.db.remove_session()
+        self.assertEqual(self.db.get_user_progress(self.user_id).total_score, 0)
+
+    def test_writes_refresh_cached_progress(self):
+        self.db.get_user_progress(self.user_id)
+        self.db.update_user_progress(self.user_id, score_delta=50, wpm=40.0, level=2)
+        progress = self.db.get_user_progress(self.user_id)
+        self.assertNotMapped(progress)
+        self.assertEqual((progress.total_score, progress.current_level), (50, 2))
+
+    def test_writes_refresh_cached_analysis(self):
+        self.assertIsNone(self.db.get_user_analysis(self.user_id))
+        self.db.update_user_analysis(self.user_id, {'tier': 'controlled', 'weak_keys': ['f']})
+        analysis = self.db.get_user_analysis(self.user_id)
+        self.assertNotMapped(analysis)
+        self.assertEqual((analysis.tier, analysis.weak_keys), ('controlled', ['f']))
+
+
+if __name__ == '__main__':
+    unittest.main()
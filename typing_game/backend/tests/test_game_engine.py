@@ -0,0 +1,229 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from database import DatabaseManager
+from game_engine import GameEngine, SessionState, SessionStore
+from text_generator import AdaptiveTextGenerator
+
+
+class FlushTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.db = DatabaseManager(os.path.join(self.tmp, 'test.db'))
+        self.engine = GameEngine(self.db, None, None)
+
+    def tearDown(self):
+        self.engine.flush()
+        self.db.remove_session()
+        self.db.engine.dispose()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_flush_waits_for_earlier_writes(self):
+        applied = []
+        for i in range(200):
+            self.engine._queue_write(applied.append, i)
+        self.engine.flush()
+        self.assertEqual(applied, list(range(200)))
+
+    def test_flush_ignores_writes_queued_after_it(self):
+        in_gate, open_gate, release = threading.Event(), threading.Event(), threading.Event()
+
+        def gate():
+            in_gate.set()
+            open_gate.wait()
+
+        # Hold the writer so the flush marker and a later write queue up
+        self.engine._queue_write(gate)
+        self.assertTrue(in_gate.wait(5))
+        flusher = threading.Thread(target=self.engine.flush)
+        flusher.start()
+        deadline = time.monotonic() + 5
+        while not self.engine._write_queue.qsize():
+            self.assertLess(time.monotonic(), deadline, 'flush marker was never queued')
+            time.sleep(0.01)
+        # Another session's write that stays blocked until the end of the test
+        self.engine._queue_write(release.wait)
+        open_gate.set()
+
+        flusher.join(5)
+        finished = not flusher.is_alive()
+        release.set()
+        flusher.join()
+        self.assertTrue(finished)
+
+    def test_failed_write_is_logged_and_later_writes_still_apply(self):
+        applied = []
+
+        def fail():
+            raise RuntimeError('boom')
+
+        with self.assertLogs('game_engine', level='ERROR'):
+            self.engine._queue_write(fail)
+            self.engine._queue_write(applied.append, 1)
+            self.assertFalse(self.engine.flush())
+        self.assertEqual(applied, [1])
+        # Reported once; the next flush starts clean
+        self.assertTrue(self.engine.flush())
+
+    def test_flush_only_reports_writes_this_thread_queued(self):
+        def fail():
+            raise RuntimeError('boom')
+
+        with self.assertLogs('game_engine', level='ERROR'):
+            other = threading.Thread(target=self.engine._queue_write, args=(fail,))
+            other.start()
+            other.join()
+            self.assertTrue(self.engine.flush())
+
+    def test_force_save_reports_a_dropped_progress_write(self):
+        def fail(**progress):
+            raise RuntimeError('database is locked')
+
+        self.engine.active_sessions['s1'] = SessionState('abc', 7, 1, 0, 'controlled', {})
+        self.db.update_user_progress = fail
+        with self.assertLogs('game_engine', level='ERROR'):
+            self.assertFalse(self.engine.force_save_user(7))
+
+    def test_malformed_item_does_not_stop_the_writer(self):
+        applied = []
+        with self.assertLogs('game_engine', level='ERROR'):
+            self.engine._write_queue.put_nowait(('not a write',))
+            # Its batch (the flush marker's too) is reported as dropped
+            self.assertFalse(self.engine.flush(timeout=5))
+        self.engine._queue_write(applied.append, 1)
+        self.assertTrue(self.engine.flush(timeout=5))
+        self.assertEqual(applied, [1])
+
+    def test_flush_gives_up_after_the_timeout(self):
+        release = threading.Event()
+        self.engine._queue_write(release.wait)
+        with self.assertLogs('game_engine', level='ERROR'):
+            self.assertFalse(self.engine.flush(timeout=0.2))
+        release.set()
+
+    def test_flush_returns_at_once_without_a_writer(self):
+        writer, self.engine._writer = self.engine._writer, threading.Thread(target=lambda: None)
+        self.engine._writer.start()
+        self.engine._writer.join()
+        try:
+            with self.assertLogs('game_engine', level='ERROR'):
+                self.assertFalse(self.engine.flush())
+        finally:
+            self.engine._writer = writer
+
+
+class SessionStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.evicted = []
+        self.store = SessionStore(2, 60, lambda session_id, state: self.evicted.append(session_id))
+
+    def add(self, session_id):
+        state = SessionState('abc', None, 1, 0, 'controlled', {})
+        self.store[session_id] = state
+        return state
+
+    def test_least_recently_used_is_evicted_on_insert(self):
+        self.add('a')
+        self.add('b')
+        self.store['a']
+        self.add('c')
+        self.assertEqual(self.evicted, ['b'])
+        self.assertEqual(list(self.store), ['a', 'c'])
+
+    def test_get_returns_none_for_missing_sessions(self):
+        state = self.add('a')
+        self.assertIs(self.store.get('a'), state)
+        self.assertIsNone(self.store.get('missing'))
+        with self.assertRaises(KeyError):
+            self.store['missing']
+
+    def test_idle_sessions_are_swept_on_read(self):
+        idle = self.add('idle')
+        self.add('busy')
+        # Goes idle after the last insert, so only a read can reap it
+        idle.last_touch -= 120
+        self.store['busy']
+        self.assertEqual(self.evicted, ['idle'])
+        self.assertNotIn('idle', self.store)
+
+
+class EvictionTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.db = DatabaseManager(os.path.join(self.tmp, 'test.db'))
+        self.engine = GameEngine(self.db, None, None)
+
+    def tearDown(self):
+        self.engine.flush()
+        self.db.remove_session()
+        self.db.engine.dispose()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_eviction_does_not_wait_for_the_writer(self):
+        release = threading.Event()
+        self.engine._queue_write(release.wait)
+        try:
+            state = SessionState('abc', None, 1, 0, 'controlled', {})
+            self.engine.active_sessions['old'] = state
+            state.last_touch -= 3600
+            started = time.monotonic()
+            self.engine.active_sessions['new'] = SessionState('abc', None, 1, 0, 'controlled', {})
+            self.assertLess(time.monotonic() - started, 1)
+            self.assertNotIn('old', self.engine.active_sessions)
+        finally:
+            release.set()
+
+
+class StubAnalyzer:
+    """Returns whatever snapshot the test sets"""
+
+    def __init__(self):
+        self.snapshot = None
+
+    def analyze_session(self, session_id, recent_only=True):
+        return {'overall': {'wpm': self.snapshot['wpm_avg']}}
+
+    def build_analysis_snapshot(self, analysis):
+        return dict(self.snapshot)
+
+
+class AnalysisSnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.db = DatabaseManager(os.path.join(self.tmp, 'test.db'))
+        self.analyzer = StubAnalyzer()
+        self.engine = GameEngine(self.db, self.analyzer, AdaptiveTextGenerator())
+        self.user_id = self.db.create_user('carol', 'secret')
+        self.engine.active_sessions['s1'] = SessionState('abc', self.user_id, 1, 0, 'controlled', {})
+
+    def tearDown(self):
+        self.engine.flush()
+        self.db.remove_session()
+        self.db.engine.dispose()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def new_text(self, **snapshot):
+        self.analyzer.snapshot = {'tier': 'controlled', 'weak_keys': ['f'], 'weak_fingers': [],
+                                  'slow_bigrams': [], 'wpm_avg': 30.0, 'accuracy_avg': 90.0,
+                                  **snapshot}
+        self.engine.active_sessions['s1'].keystroke_count = 51
+        self.engine.generate_new_text('s1')
+        self.engine.flush()
+        return self.db.get_user_analysis(self.user_id)
+
+    def test_changed_averages_are_written(self):
+        self.assertEqual(self.new_text().wpm_avg, 30.0)
+        analysis = self.new_text(wpm_avg=45.0, accuracy_avg=97.0)
+        self.assertEqual((analysis.wpm_avg, analysis.accuracy_avg), (45.0, 97.0))
+
+    def test_unchanged_profile_is_not_rewritten(self):
+        written = self.new_text().updated_at
+        self.assertEqual(self.new_text(wpm_avg=30.2).updated_at, written)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+
+from text_generator import AdaptiveTextGenerator
+
+
+class FoundationalModeTest(unittest.TestCase):
+    def setUp(self):
+        self.generator = AdaptiveTextGenerator()
+
+    def test_empty_focus_key_is_ignored(self):
+        # '' is the expected key of keystrokes typed past the end of a text
+        text = self.generator.generate_text(
+            'foundational', 10, [{'type': 'high_error_keys', 'items': ['', 'd', 'r']}]
+        )
+        words = text.split(' ')
+        self.assertEqual(len(words), 10)
+        self.assertTrue(all(words))
+
+    def test_only_empty_focus_keys_fall_back_to_home_row(self):
+        text = self.generator.generate_text(
+            'foundational', 10, [{'type': 'high_error_keys', 'items': ['']}]
+        )
+        self.assertEqual(len(text.split(' ')), 10)
+
+
+class MasteredPatternTest(unittest.TestCase):
+    def setUp(self):
+        self.generator = AdaptiveTextGenerator()
+
+    def test_mastered_bigram_is_replaced_by_words_without_it(self):
+        mastered = [{'type': 'mastered_keys', 'items': ['th']}]
+        replaced = []
+        for _ in range(50):
+            words = self.generator._reduce_mastered_patterns(['the', 'this', 'that'] * 4, mastered)
+            replaced.extend(w for w in words if w not in ('the', 'this', 'that'))
+        self.assertTrue(replaced)
+        self.assertFalse([w for w in replaced if 'th' in w])
+
+    def test_replacements_are_checked_against_later_keys(self):
+        # Every draw hits, so each key's pass strips it from all words
+        self.generator._rng = SimpleNamespace(random=np.zeros)
+        mastered = [{'type': 'mastered_keys', 'items': ['a', 'e']}]
+        with mock.patch('text_generator.random.random', return_value=0.0):
+            words = self.generator._reduce_mastered_patterns(['cat', 'hat', 'bat'] * 10, mastered)
+        self.assertFalse([w for w in words if 'e' in w])
+
+
+if __name__ == '__main__':
+    unittest.main()
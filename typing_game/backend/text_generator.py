@@ -1,54 +1,193 @@
 import random
 import string
+import sys
+from bisect import bisect_left
+from functools import lru_cache
+from itertools import accumulate
 from collections import defaultdict
-import re
+import numpy as np
+
+# Letter classes for membership tests
+_VOWELS = frozenset('aeiou')
+
+# Foundational drill structures as slot codes, padded to a common width;
+# the last column is always the word separator
+_SLOT_C, _SLOT_V, _SLOT_PAD, _SLOT_SEP = 0, 1, 2, 3
+_DRILL_STRUCTURES = np.array([
+    [_SLOT_C if t == 'c' else _SLOT_V for t in structure]
+    + [_SLOT_PAD] * (4 - len(structure)) + [_SLOT_SEP]
+    for structure in ('cvc', 'cv', 'vc', 'cvcv', 'vcc', 'cvcc')
+], dtype=np.uint8)
+
+def _compile_template(template):
+    """Parse a sentence template once into word tokens, its distinct fields and
+    its word count. Each token is (literal, None) for a fixed word or
+    (None, field) for a '{field}' slot; every field fills in exactly one word."""
+    tokens = []
+    for token in template.split():
+        parsed = list(string.Formatter().parse(token))
+        if len(parsed) == 1 and not parsed[0][0] and parsed[0][1]:
+            tokens.append((None, parsed[0][1]))
+        else:
+            tokens.append((token, None))
+    fields = tuple(dict.fromkeys(field for _, field in tokens if field))
+    return tuple(tokens), fields, len(tokens)
+
+def _letter_mask(text):
+    """Bit i set for each lowercase letter chr(97 + i) in text"""
+    mask = 0
+    for char in text:
+        if 'a' <= char <= 'z':
+            mask |= 1 << (ord(char) - 97)
+    return mask
+
+def _interned(*words):
+    """Immutable word bank with interned strings"""
+    return tuple(sys.intern(w) for w in words)
+
+def _intern_keys(areas, area_type):
+    """Copy of areas with the string items of area_type interned"""
+    return [
+        {**area, 'items': [sys.intern(k) if type(k) is str else k for k in area['items']]}
+        if area['type'] == area_type else area
+        for area in areas
+    ]
+
+def _build_char_index(banks):
+    """bank name -> char -> words in that bank containing the char"""
+    index = {}
+    for name, bank in banks.items():
+        contains = defaultdict(list)
+        for word in bank:
+            for char in set(word):
+                contains[char].append(word)
+        index[name] = dict(contains)
+    return index
+
+def _build_without_index(words, chars):
+    """char -> tuple whose entry n lists the words (in order) that lack the
+    char and are at most n letters long; the last entry also serves every
+    larger n"""
+    longest = max(map(len, words))
+    return {
+        char: tuple(tuple(w for w in words if char not in w and len(w) <= n)
+                    for n in range(longest + 1))
+        for char in chars
+    }
 
 class AdaptiveTextGenerator:
+    # Word banks are shared, immutable and built once at import
+    # Common words for different difficulty levels
+    easy_words = _interned(
+        'the', 'and', 'for', 'are', 'but', 'not', 'you', 'all', 'can', 'had',
+        'was', 'how', 'its', 'our', 'who', 'get', 'day', 'out', 'use', 'she'
+    )
+    
+    medium_words = _interned(
+        'which', 'there', 'their', 'about', 'would', 'these', 'other', 'words',
+        'could', 'write', 'first', 'water', 'after', 'where', 'right', 'think',
+        'years', 'thing', 'looks', 'never', 'under', 'might', 'while', 'house'
+    )
+    
+    hard_words = _interned(
+        'through', 'thought', 'against', 'between', 'another', 'because',
+        'country', 'example', 'however', 'important', 'language', 'national',
+        'possible', 'program', 'question', 'remember', 'sentence', 'together'
+    )
+    
+    expert_words = _interned(
+        'philosophical', 'mathematical', 'interpretation', 'configuration',
+        'authentication', 'transformation', 'implementation', 'consciousness',
+        'comprehensive', 'environmental', 'unprecedented', 'simultaneously',
+        'acknowledgment', 'investigation', 'communication', 'representation',
+        'significance', 'infrastructure', 'collaboration', 'extraordinary'
+    )
+    
+    grandmaster_words = _interned(
+        'characterization', 'multidimensional', 'counterintuitive', 'interdisciplinary',
+        'telecommunications', 'indistinguishable', 'microarchitecture', 'cryptographically',
+        'misunderstanding', 'responsibilities', 'industrialization', 'institutionalized',
+        'compartmentalized', 'unconstitutionally', 'disproportionately', 'inappropriateness',
+        'enthusiastically', 'interchangeability', 'underestimated', 'misrepresentation'
+    )
+    
+    # Performance-mode sentence slot fillers
+    adjectives = _interned('quick', 'brown', 'lazy', 'bright', 'dark', 'clever', 'simple', 'rapid', 'silent', 'efficient')
+    nouns = _interned('fox', 'dog', 'cat', 'horse', 'bird', 'program', 'system', 'algorithm', 'network', 'interface')
+    verbs = _interned('jumps', 'runs', 'flies', 'types', 'codes', 'thinks', 'learns', 'processes', 'computes', 'analyzes')
+    adverbs = _interned('quickly', 'slowly', 'carefully', 'eagerly', 'quietly', 'efficiently', 'precisely', 'instantly')
+    places = _interned('forest', 'house', 'garden', 'office', 'library', 'server', 'database', 'mainframe')
+    names = _interned('Alex', 'Taylor', 'Jordan', 'Casey', 'Morgan', 'Sam', 'Riley')
+    numbers = _interned(*map(str, range(2, 11)))
+    
+    # Performance-mode sentence templates per tier, compiled at import
+    _hard_templates = tuple(map(_compile_template, (
+        "The {adj} {noun} {verb} {adv} through the {place}",
+        "{Name} quickly {verb} the {adj} {noun} from the {place}",
+        "Although the {noun} was {adj} it {verb} {adv}",
+        "When {name} {verb} the {noun} everything {verb} {adj}",
+        "{Number} {adj} {noun} {verb} {adv} toward the {place}",
+        "The {adj} {noun} and the {adj} {noun} {verb} {adv} together"
+    )))
+    _expert_templates = tuple(map(_compile_template, (
+        "The {adj} {noun} {verb} {adv} through the {place}",
+        "The {complex} {noun} {verb} the {adj} {noun}",
+        "Because of {complex} the {noun} {verb} {adv}",
+        "{Name} {verb} the {complex} {noun} from the {place}",
+        "The {adj} {noun} is {complex} and {adj}",
+        "While {name} {verb} the {noun} the {complex} {noun} {verb} {adv}"
+    )))
+    _grandmaster_templates = tuple(map(_compile_template, (
+        "The {complex} {noun} {verb} {adv} despite the {complex} {noun}",
+        "Understanding {complex} requires {adj} {noun} and {complex} {noun}",
+        "The {noun} {verb} {adv} because of the {complex} {noun}",
+        "Although {complex} is {adj} the {noun} {verb} {complex}",
+        "The {complex} {noun} and {complex} {noun} {verb} {adv}",
+        "It was {complex} that the {noun} {verb} the {complex} {noun}",
+        "The {adj} {noun} demonstrated {complex} during the {complex} {noun}"
+    )))
+    
+    # (length_words above which the tier applies, complex words, templates,
+    # shortest template's word count), most demanding tier first
+    _performance_tiers = tuple(
+        (threshold, words, templates, min(count for _, _, count in templates))
+        for threshold, words, templates in (
+            (80, grandmaster_words, _grandmaster_templates),
+            (40, expert_words, _expert_templates),
+            (0, hard_words, _hard_templates),
+        )
+    )
+    
+    # Special focus patterns
+    vowel_combinations = _interned('ae', 'ai', 'ao', 'au', 'ea', 'ei', 'eo', 'eu', 
+                                   'ia', 'ie', 'io', 'iu', 'oa', 'oe', 'oi', 'ou', 
+                                   'ua', 'ue', 'ui', 'uo')
+    consonant_clusters = _interned('str', 'thr', 'spr', 'scr', 'spl', 'shr', 
+                                   'cht', 'nth', 'rth', 'lth')
+    
+    # Per-character word indexes: bank -> char -> words that contain that char
+    _contains = _build_char_index({'easy': easy_words, 'medium': medium_words, 'hard': hard_words})
+    
+    # Medium words with their letter set as a 26-bit mask, for
+    # "does not contain key" filters
+    _medium_masks = tuple((w, _letter_mask(w)) for w in medium_words)
+    
+    # Lowercase letter -> medium words without it, bucketed by max length
+    _medium_without = _build_without_index(medium_words, string.ascii_lowercase)
+    
+    # Easy bank as an object array for vectorized draws
+    _easy_arr = np.array(easy_words, dtype=object)
+    
+    # Banks and indexes above are class attributes; only this is per-instance
+    __slots__ = ('focus_patterns', 'mastered_patterns', '_rng')
+    
     def __init__(self, word_list_path=None):
-        # Common words for different difficulty levels
-        self.easy_words = [
-            'the', 'and', 'for', 'are', 'but', 'not', 'you', 'all', 'can', 'had',
-            'was', 'how', 'its', 'our', 'who', 'get', 'day', 'out', 'use', 'she'
-        ]
-        
-        self.medium_words = [
-            'which', 'there', 'their', 'about', 'would', 'these', 'other', 'words',
-            'could', 'write', 'first', 'water', 'after', 'where', 'right', 'think',
-            'years', 'thing', 'looks', 'never', 'under', 'might', 'while', 'house'
-        ]
-        
-        self.hard_words = [
-            'through', 'thought', 'against', 'between', 'another', 'because',
-            'country', 'example', 'however', 'important', 'language', 'national',
-            'possible', 'program', 'question', 'remember', 'sentence', 'together'
-        ]
-        
-        self.expert_words = [
-            'philosophical', 'mathematical', 'interpretation', 'configuration',
-            'authentication', 'transformation', 'implementation', 'consciousness',
-            'comprehensive', 'environmental', 'unprecedented', 'simultaneously',
-            'acknowledgment', 'investigation', 'communication', 'representation',
-            'significance', 'infrastructure', 'collaboration', 'extraordinary'
-        ]
-        
-        self.grandmaster_words = [
-            'characterization', 'multidimensional', 'counterintuitive', 'interdisciplinary',
-            'telecommunications', 'indistinguishable', 'microarchitecture', 'cryptographically',
-            'misunderstanding', 'responsibilities', 'industrialization', 'institutionalized',
-            'compartmentalized', 'unconstitutionally', 'disproportionately', 'inappropriateness',
-            'enthusiastically', 'interchangeability', 'underestimated', 'misrepresentation'
-        ]
-        
-        # Special focus patterns
-        self.vowel_combinations = ['ae', 'ai', 'ao', 'au', 'ea', 'ei', 'eo', 'eu', 
-                                  'ia', 'ie', 'io', 'iu', 'oa', 'oe', 'oi', 'ou', 
-                                  'ua', 'ue', 'ui', 'uo']
-        self.consonant_clusters = ['str', 'thr', 'spr', 'scr', 'spl', 'shr', 
-                                  'cht', 'nth', 'rth', 'lth']
-        
         # Initialize with basic patterns
         self.focus_patterns = []
         self.mastered_patterns = []
+        
+        # Vectorized sampling for bulk word draws
+        self._rng = np.random.default_rng()
     
     def generate_text(self, mode='controlled', length_words=10, focus_areas=None, mastered_items=None):
         """Generate adaptive text based on training mode"""
@@ -58,6 +197,10 @@ class AdaptiveTextGenerator:
         if mastered_items is None:
             mastered_items = []
         
+        # Intern incoming keys once so index lookups hit the same objects
+        focus_areas = _intern_keys(focus_areas, 'high_error_keys')
+        mastered_items = _intern_keys(mastered_items, 'mastered_keys')
+        
         # Dispatch to specific mode generator
         if mode == 'foundational':
             return self._generate_foundational(length_words, focus_areas)
@@ -77,6 +220,10 @@ class AdaptiveTextGenerator:
         2. Encode context: inputs = tokenizer.encode(prompt_context, return_tensors='pt')
         3. Generate: outputs = model.generate(inputs, max_length=50, do_sample=True)
         4. Return decoded text
+        
+        Import the model libraries inside this method, on first use, rather
+        than at module level: importing text_generator must stay cheap for
+        the three modes that never touch them.
         """
         # For now, return a placeholder string
         return "The neural network is dreaming of electric sheep."
@@ -87,7 +234,9 @@ class AdaptiveTextGenerator:
         target_keys = []
         for area in focus_areas:
             if area['type'] == 'high_error_keys':
-                target_keys.extend(area['items'])
+                # Only single characters can fill a drill slot ('' is what
+                # keystrokes past the end of a text expect)
+                target_keys.extend(k for k in area['items'] if len(k) == 1)
         
         # Ensure we have a base set if targets are sparse
         if not target_keys:
@@ -97,7 +246,7 @@ class AdaptiveTextGenerator:
         pool = set(target_keys)
         
         # If the pool lacks vowels, add basic ones to allow word formation
-        if not any(k in 'aeiou' for k in pool):
+        if pool.isdisjoint(_VOWELS):
             pool.update(['a', 'e'])
             
         # If the pool is too small, add common consonants
@@ -105,193 +254,162 @@ class AdaptiveTextGenerator:
             pool.update(['t', 'n', 'r'])
             
         pool_list = list(pool)
-        vowels = [k for k in pool_list if k in 'aeiou']
-        consonants = [k for k in pool_list if k not in 'aeiou']
+        vowels = [k for k in pool_list if k in _VOWELS]
+        consonants = [k for k in pool_list if k not in _VOWELS]
         
         # Fallbacks just in case
         if not vowels: vowels = ['a', 'e']
         if not consonants: consonants = ['t', 'n']
 
-        # Generate pronounceable pseudo-words (Keybr style)
-        words = []
-        for _ in range(length_words):
-            # Randomly choose a structure: CVC, CV, VC, CVCV, etc.
-            structure = random.choice(['cvc', 'cv', 'vc', 'cvcv', 'vcc', 'cvcc'])
-            word = ''
-            for char_type in structure:
-                if char_type == 'c':
-                    word += random.choice(consonants)
-                else:
-                    word += random.choice(vowels)
-            words.append(word)
-            
-        return ' '.join(words)
+        # Generate pronounceable pseudo-words (Keybr style): pick a structure
+        # (CVC, CV, VC, CVCV, etc.) per word, then fill every slot of every
+        # word at once in a code point buffer
+        if length_words <= 0:
+            return ''
+        rng = self._rng
+        slots = _DRILL_STRUCTURES[rng.integers(len(_DRILL_STRUCTURES), size=length_words)]
+        consonant_codes = np.array([ord(k) for k in consonants], dtype=np.uint32)
+        vowel_codes = np.array([ord(k) for k in vowels], dtype=np.uint32)
+        
+        buf = np.full(slots.shape, ord(' '), dtype=np.uint32)
+        is_c = slots == _SLOT_C
+        is_v = slots == _SLOT_V
+        buf[is_c] = consonant_codes[rng.integers(len(consonant_codes), size=int(is_c.sum()))]
+        buf[is_v] = vowel_codes[rng.integers(len(vowel_codes), size=int(is_v.sum()))]
+        
+        # Keep filled slots plus the trailing separator column
+        keep = slots != _SLOT_PAD
+        return buf[keep].tobytes().decode('utf-32-le')[:-1]
     
     def _generate_controlled(self, length_words, focus_areas):
         """Mode 2: Controlled Language (Rhythm and Flow)"""
-        words = []
-        
         # Include focus patterns if any
-        focus_words = []
-        for area in focus_areas:
-            if area['type'] == 'high_error_keys':
-                for key in area['items']:
-                    # Create words containing the problematic key
-                    for word in self.easy_words:
-                        if key in word and len(word) <= 5:
-                            focus_words.append(word)
+        focus_keys = tuple(sorted(
+            key for area in focus_areas if area['type'] == 'high_error_keys' for key in area['items']
+        ))
+        focus_words = self._focus_words_for(focus_keys)
         
-        # Mix focus words with regular words
-        for i in range(length_words):
-            if focus_words and random.random() < 0.4:  # 40% focus words
-                words.append(random.choice(focus_words))
-            else:
-                words.append(random.choice(self.easy_words))
-            
+        # Mix focus words with regular words (40% focus words), drawn in bulk
+        rng = self._rng
+        if not len(focus_words):
+            return ' '.join(rng.choice(self._easy_arr, length_words))
+        
+        n_focus = rng.binomial(length_words, 0.4)
+        words = np.concatenate((
+            rng.choice(focus_words, n_focus),
+            rng.choice(self._easy_arr, length_words - n_focus),
+        ))
+        rng.shuffle(words)
         return ' '.join(words)
 
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def _focus_words_for(keys):
+        """Easy words (up to 5 chars) containing each of the sorted focus keys,
+        one entry per (key, word) match, cached since focus keys rarely change
+        within a session"""
+        contains = AdaptiveTextGenerator._contains['easy']
+        return np.array([w for key in keys for w in contains.get(key, ()) if len(w) <= 5], dtype=object)
+
     def _generate_performance(self, length_words, focus_areas, mastered_items):
         """Mode 3: Performance (Precision at Speed)"""
+        if length_words <= 0:
+            return ''
         components = []
         
         # Determine difficulty tier based on length (which comes from WPM)
-        is_grandmaster = length_words > 80
-        is_expert = length_words > 40
+        for threshold, complex_words, templates, shortest in self._performance_tiers:
+            if length_words > threshold:
+                break
         
-        # Select word banks and templates based on tier
-        if is_grandmaster:
-            complex_words = self.grandmaster_words
-            sentence_templates = [
-                "The {complex} {noun} {verb} {adv} despite the {complex} {noun}",
-                "Understanding {complex} requires {adj} {noun} and {complex} {noun}",
-                "The {noun} {verb} {adv} because of the {complex} {noun}",
-                "Although {complex} is {adj} the {noun} {verb} {complex}",
-                "The {complex} {noun} and {complex} {noun} {verb} {adv}",
-                "It was {complex} that the {noun} {verb} the {complex} {noun}",
-                "The {adj} {noun} demonstrated {complex} during the {complex} {noun}"
-            ]
-        elif is_expert:
-            complex_words = self.expert_words
-            sentence_templates = [
-                "The {adj} {noun} {verb} {adv} through the {place}",
-                "The {complex} {noun} {verb} the {adj} {noun}",
-                "Because of {complex} the {noun} {verb} {adv}",
-                "{Name} {verb} the {complex} {noun} from the {place}",
-                "The {adj} {noun} is {complex} and {adj}",
-                "While {name} {verb} the {noun} the {complex} {noun} {verb} {adv}"
-            ]
-        else:
-            complex_words = self.hard_words
-            sentence_templates = [
-                "The {adj} {noun} {verb} {adv} through the {place}",
-                "{Name} quickly {verb} the {adj} {noun} from the {place}",
-                "Although the {noun} was {adj} it {verb} {adv}",
-                "When {name} {verb} the {noun} everything {verb} {adj}",
-                "{Number} {adj} {noun} {verb} {adv} toward the {place}",
-                "The {adj} {noun} and the {adj} {noun} {verb} {adv} together"
-            ]
+        field_banks = {
+            'adj': self.adjectives, 'noun': self.nouns, 'verb': self.verbs, 'adv': self.adverbs,
+            'place': self.places, 'name': self.names, 'Name': self.names, 'complex': complex_words,
+            'Number': self.numbers
+        }
         
-        # Word banks
-        adjectives = ['quick', 'brown', 'lazy', 'bright', 'dark', 'clever', 'simple', 'rapid', 'silent', 'efficient']
-        nouns = ['fox', 'dog', 'cat', 'horse', 'bird', 'program', 'system', 'algorithm', 'network', 'interface']
-        verbs = ['jumps', 'runs', 'flies', 'types', 'codes', 'thinks', 'learns', 'processes', 'computes', 'analyzes']
-        adverbs = ['quickly', 'slowly', 'carefully', 'eagerly', 'quietly', 'efficiently', 'precisely', 'instantly']
-        places = ['forest', 'house', 'garden', 'office', 'library', 'server', 'database', 'mainframe']
-        names = ['Alex', 'Taylor', 'Jordan', 'Casey', 'Morgan', 'Sam', 'Riley']
+        # Sentence word counts are fixed per template, so draw enough templates
+        # up front and keep the shortest prefix that reaches length_words
+        picks = random.choices(templates, k=-(-length_words // shortest))
+        n_sentences = bisect_left(list(accumulate(count for _, _, count in picks)), length_words) + 1
+        picks = picks[:n_sentences]
         
-        words_used = 0
-        
-        while words_used < length_words:
-            template = random.choice(sentence_templates)
-            
-            # Helper to get a complex word
-            def get_complex():
-                return random.choice(complex_words)
-
-            sentence = template.format(
-                adj=random.choice(adjectives),
-                noun=random.choice(nouns),
-                verb=random.choice(verbs),
-                adv=random.choice(adverbs),
-                place=random.choice(places),
-                name=random.choice(names),
-                Name=random.choice(names),
-                Number=random.randint(2, 10),
-                complex=get_complex()
-            )
-            
-            # Inject focus patterns if any
-            if focus_areas:
-                sentence = self._inject_focus_patterns(sentence, focus_areas)
-            
-            # Remove mastered patterns if any
-            if mastered_items:
-                sentence = self._reduce_mastered_patterns(sentence, mastered_items)
-            
-            components.append(sentence)
-            words_used += len(sentence.split())
+        # One uniform draw per field of every sentence, taken in a single call
+        draws = iter(self._rng.random(sum(len(fields) for _, fields, _ in picks)).tolist())
+        for tokens, fields, _ in picks:
+            components.extend(self._build_sentence(tokens, fields, field_banks, draws,
+                                                   focus_areas, mastered_items))
         
         return ' '.join(components)
     
-    def _create_word_with_bigram(self, bigram):
-        """Create or find a word containing the specified bigram"""
-        # Check existing word lists
-        all_words = self.easy_words + self.medium_words + self.hard_words
-        matching_words = [w for w in all_words if bigram in w]
-        
-        if matching_words:
-            return random.choice(matching_words)
+    def _build_sentence(self, tokens, fields, field_banks, draws, focus_areas, mastered_items):
+        """Fill a compiled template straight into a word list and apply the
+        focus / mastered transforms to it"""
+        # One value per distinct field, as str.format would substitute; the
+        # banks are short tuples, so index them directly off the next
+        # uniform draw from `draws`
+        values = {}
+        for field, u in zip(fields, draws):
+            bank = field_banks[field]
+            values[field] = bank[int(u * len(bank))]
+        words = [values[field] if field else literal for literal, field in tokens]
         
-        # Try to create a plausible word
-        vowels = 'aeiou'
-        consonants = 'bcdfghjklmnpqrstvwxyz'
+        # Inject focus patterns if any
+        if focus_areas:
+            self._inject_focus_patterns(words, focus_areas)
         
-        # Simple word creation around the bigram
-        if len(bigram) == 2:
-            if bigram[0] in consonants and bigram[1] in vowels:
-                # CV pattern
-                prefix = random.choice(consonants) if random.random() < 0.5 else ''
-                suffix = random.choice(vowels + 's') if random.random() < 0.5 else ''
-                return prefix + bigram + suffix
-            elif bigram[0] in vowels and bigram[1] in consonants:
-                # VC pattern
-                prefix = random.choice(vowels) if random.random() < 0.5 else ''
-                suffix = random.choice(consonants + 's') if random.random() < 0.5 else ''
-                return prefix + bigram + suffix
+        # Remove mastered patterns if any
+        if mastered_items:
+            self._reduce_mastered_patterns(words, mastered_items)
         
-        return None
+        return words
     
-    def _inject_focus_patterns(self, text, focus_areas):
-        """Inject focus patterns into text"""
-        words = text.split()
-        
+    def _inject_focus_patterns(self, words, focus_areas):
+        """Inject focus patterns into a word list (in place)"""
         for area in focus_areas:
             if area['type'] == 'high_error_keys' and random.random() < 0.7:
-                # Replace some words with ones containing focus keys
-                for key in area['items'][:2]:  # First 2 focus keys
-                    for i in range(len(words)):
-                        if random.random() < 0.3:
-                            # Find a word containing this key
-                            possible = [w for w in self.medium_words if key in w]
-                            if possible:
-                                words[i] = random.choice(possible)
+                # Replace some words with ones containing focus keys: each of
+                # the first 2 focus keys (with words to offer) claims a word
+                # with probability 0.3, later keys taking precedence. Walking
+                # the keys last-first, key j wins with 0.3 * 0.7**j, so one
+                # draw per word against the cumulative edges picks the key
+                pools = [possible for possible in
+                         map(self._contains['medium'].get, area['items'][:2]) if possible]
+                if not pools:
+                    continue
+                pools.reverse()
+                edges = 1 - 0.7 ** np.arange(1, len(pools) + 1)
+                winner = np.searchsorted(edges, self._rng.random(len(words)), side='right')
+                for j, possible in enumerate(pools):
+                    hits = np.flatnonzero(winner == j)
+                    for i, word in zip(hits, random.choices(possible, k=len(hits))):
+                        words[i] = word
         
-        return ' '.join(words)
+        return words
     
-    def _reduce_mastered_patterns(self, text, mastered_items):
-        """Reduce frequency of mastered patterns"""
-        words = text.split()
-        
+    def _reduce_mastered_patterns(self, words, mastered_items):
+        """Reduce frequency of mastered patterns in a word list (in place)"""
         for item in mastered_items:
             if item['type'] == 'mastered_keys' and random.random() < 0.6:
                 # Avoid overusing mastered keys
                 for key in item['items'][:3]:  # First 3 mastered keys
-                    for i in range(len(words)):
-                        if key in words[i] and random.random() < 0.4:
+                    # Each key sees the words as earlier keys left them
+                    by_len = self._medium_without.get(key)
+                    key_bits = _letter_mask(key)
+                    coins = self._rng.random(len(words)) < 0.4
+                    for i, word in enumerate(words):
+                        if coins[i] and key in word:
                             # Replace with a word without this key
-                            alternatives = [w for w in self.medium_words 
-                                          if key not in w and len(w) <= len(words[i]) + 2]
+                            max_len = len(word) + 2
+                            if by_len:
+                                alternatives = by_len[min(max_len, len(by_len) - 1)]
+                            elif len(key) == 1:
+                                alternatives = [w for w, mask in self._medium_masks
+                                                if not mask & key_bits and len(w) <= max_len]
+                            else:
+                                alternatives = [w for w in self.medium_words
+                                                if key not in w and len(w) <= max_len]
                             if alternatives:
                                 words[i] = random.choice(alternatives)
         
-        return ' '.join(words)
\ No newline at end of file
+        return words
\ No newline at end of file